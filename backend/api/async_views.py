@@ -0,0 +1,307 @@
+'''Асинхронные версии эндпоинтов чтения: /api/async/...
+
+В Django 3.2 нет асинхронного ORM, поэтому запросы выполняются в
+отдельном пуле потоков (database), где у каждого потока свое
+постоянное соединение. Независимые запросы (строки страницы, COUNT,
+теги, ингредиенты, флаги пользователя) идут одновременно, а цикл
+событий обслуживает много запросов без потока на каждый.
+'''
+import asyncio
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.models import AnonymousUser
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections
+from django.http import HttpResponse, JsonResponse
+from rest_framework.exceptions import (APIException, MethodNotAllowed,
+                                       NotAuthenticated, NotFound)
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.authentication import CachedTokenAuthentication
+from api.db_router import choose_replica
+from api.filters import RecipeFilter
+from api.middleware import measure, query_stats
+from api.pagination import LimitPagination
+from api.renderers import SHOPPING_LIST_RENDERERS
+from api.search import ingredient_index, search_ingredients
+from api.serializers import (IngredientSerializer, ShowRecipeSerializer,
+                             TagSerializer)
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag, TagsInRecipe)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.ASYNC_DB_WORKERS,
+                thread_name_prefix='async-db',
+            )
+    return _executor
+
+
+def _call(stats, function, args):
+    close_old_connections()
+    try:
+        with ExitStack() as stack:
+            if stats is not None:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+            return function(*args)
+    finally:
+        close_old_connections()
+
+
+async def database(function, *args):
+    '''Вызов синхронного кода с запросами к БД в пуле потоков БД.'''
+    return await asyncio.get_running_loop().run_in_executor(
+        get_executor(), _call, query_stats.get(), function, args)
+
+
+def serialize(request, serializer):
+    '''serializer.data с замером времени (Server-Timing: serialize).'''
+    with measure(request, 'serialize'):
+        return serializer.data
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, safe=False,
+                        json_dumps_params={'ensure_ascii': False})
+
+
+def authenticate(request):
+    '''Пользователь по токену и база для чтения (реплика или default).'''
+    result = CachedTokenAuthentication().authenticate(request)
+    user = result[0] if result else AnonymousUser()
+    return user, choose_replica(user) or DEFAULT_DB_ALIAS
+
+
+def async_api_view(view):
+    '''GET-view: аутентификация токеном и ошибки DRF в виде JSON.
+
+    View получает request.user и алиас БД для чтения.
+    '''
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            if request.method not in ('GET', 'HEAD'):
+                raise MethodNotAllowed(request.method)
+            request.user, alias = await database(authenticate, request)
+            return await view(request, alias, *args, **kwargs)
+        except APIException as exc:
+            return json_response({'detail': exc.detail}, exc.status_code)
+    return wrapper
+
+
+def positive_int(value, default=None):
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return default
+    return value if value > 0 else default
+
+
+def page_link(request, page):
+    url = request.build_absolute_uri()
+    if page == 1:
+        return remove_query_param(url, 'page')
+    return replace_query_param(url, 'page', page)
+
+
+def fetch_recipes(alias, ids):
+    return Recipe.objects.using(alias).select_related('author').in_bulk(ids)
+
+
+def fetch_tags(alias, ids):
+    return list(TagsInRecipe.objects.using(alias).filter(
+        recipe__in=ids).select_related('tag').order_by('tag__name'))
+
+
+def fetch_amounts(alias, ids):
+    return list(IngredientAmount.objects.using(alias).filter(
+        recipe__in=ids).select_related('ingredient'))
+
+
+def fetch_marked(model, alias, user, ids):
+    return set(model.objects.using(alias).filter(
+        user=user, recipe__in=ids).values_list('recipe', flat=True))
+
+
+def attach(instance, name, objects):
+    '''Заранее загруженные объекты как результат prefetch_related.'''
+    queryset = getattr(instance, name).all()
+    queryset._result_cache = objects
+    queryset._prefetch_done = True
+    instance._prefetched_objects_cache[name] = queryset
+
+
+async def recipes_data(request, alias, ids):
+    '''Рецепты ids в порядке ids для ShowRecipeSerializer.
+
+    Строки, теги, ингредиенты и флаги пользователя загружаются
+    одновременно, а не друг за другом, как при prefetch_related.
+    '''
+    user = request.user
+    calls = [
+        database(fetch_recipes, alias, ids),
+        database(fetch_tags, alias, ids),
+        database(fetch_amounts, alias, ids),
+    ]
+    if user.is_authenticated:
+        calls += [database(fetch_marked, model, alias, user, ids)
+                  for model in (Favorite, ShoppingCart)]
+    recipes, tags, amounts, *marked = await asyncio.gather(*calls)
+    favorited, in_cart = marked or (set(), set())
+    related = {pk: ([], []) for pk in recipes}
+    for link in tags:
+        related[link.recipe_id][0].append(link.tag)
+    for amount in amounts:
+        related[amount.recipe_id][1].append(amount)
+    page = []
+    for pk in ids:
+        recipe = recipes.get(pk)
+        if recipe is None:
+            continue
+        recipe._prefetched_objects_cache = {}
+        attach(recipe, 'tags', related[pk][0])
+        attach(recipe, 'ingredientamount_set', related[pk][1])
+        recipe.is_favorited = pk in favorited
+        recipe.is_in_shopping_cart = pk in in_cart
+        page.append(recipe)
+    return serialize(request, ShowRecipeSerializer(
+        page, many=True, context={'request': request}))
+
+
+def page_ids(queryset, offset, limit):
+    return list(queryset.values_list('pk', flat=True)[offset:offset + limit])
+
+
+@async_api_view
+async def recipe_list(request, alias):
+    '''Список рецептов с фильтрами и ?page= / ?limit= как в API.'''
+    filterset = RecipeFilter(
+        request.GET, queryset=Recipe.objects.using(alias), request=request)
+    if not filterset.is_valid():
+        return json_response(filterset.errors, 400)
+    queryset = filterset.qs
+    limit = positive_int(
+        request.GET.get('limit'), LimitPagination.page_size)
+    page = positive_int(request.GET.get('page', 1))
+    if page is None:
+        raise NotFound(LimitPagination.invalid_page_message)
+    count, ids = await asyncio.gather(
+        database(queryset.count),
+        database(page_ids, queryset, (page - 1) * limit, limit),
+    )
+    if not ids and page > 1:
+        raise NotFound(LimitPagination.invalid_page_message)
+    results = await recipes_data(request, alias, ids)
+    return json_response(OrderedDict([
+        ('count', count),
+        ('next', page_link(request, page + 1)
+         if page * limit < count else None),
+        ('previous', page_link(request, page - 1) if page > 1 else None),
+        ('results', results),
+    ]))
+
+
+@async_api_view
+async def recipe_detail(request, alias, pk):
+    results = await recipes_data(request, alias, [pk])
+    if not results:
+        raise NotFound()
+    return json_response(results[0])
+
+
+def fetch_all(queryset):
+    return list(queryset)
+
+
+def fetch_one(queryset, pk):
+    instance = queryset.filter(pk=pk).first()
+    if instance is None:
+        raise NotFound()
+    return instance
+
+
+@async_api_view
+async def tag_list(request, alias):
+    tags = await database(fetch_all, Tag.objects.using(alias))
+    return json_response(serialize(request, TagSerializer(tags, many=True)))
+
+
+@async_api_view
+async def tag_detail(request, alias, pk):
+    tag = await database(fetch_one, Tag.objects.using(alias), pk)
+    return json_response(serialize(request, TagSerializer(tag)))
+
+
+@async_api_view
+async def ingredient_list(request, alias):
+    '''Ингредиенты, ?name= - поиск как в IngredientsViewSet.'''
+    name = request.GET.get('name')
+    if name and settings.INGREDIENT_SEARCH_IN_MEMORY:
+        return json_response(await database(ingredient_index.search, name))
+    queryset = Ingredient.objects.using(alias)
+    if name:
+        queryset = search_ingredients(queryset, name)
+    ingredients = await database(fetch_all, queryset)
+    return json_response(
+        serialize(request, IngredientSerializer(ingredients, many=True)))
+
+
+@async_api_view
+async def ingredient_detail(request, alias, pk):
+    ingredient = await database(
+        fetch_one, Ingredient.objects.using(alias), pk)
+    return json_response(serialize(request, IngredientSerializer(ingredient)))
+
+
+def fetch_shopping_list(alias, user):
+    return list(user.shopping_cart_totals.using(alias).values(
+        'ingredient__name',
+        'ingredient__measurement_unit',
+        'amount',
+    ).order_by('ingredient__name'))
+
+
+def render_shopping_list(renderer, ingredients):
+    return HttpResponse(
+        renderer.stream(ingredients), content_type=renderer.content_type)
+
+
+@async_api_view
+async def download_shopping_cart(request, alias):
+    '''Скачивание корзины: ?format=txt|csv|pdf.
+
+    Файл строится целиком вне цикла событий, списки покупок
+    небольшие.
+    '''
+    if not request.user.is_authenticated:
+        raise NotAuthenticated()
+    renderers = {
+        renderer.format: renderer for renderer in SHOPPING_LIST_RENDERERS}
+    renderer_class = renderers.get(
+        request.GET.get('format', SHOPPING_LIST_RENDERERS[0].format))
+    if renderer_class is None:
+        raise NotFound()
+    renderer = renderer_class()
+    ingredients = await database(fetch_shopping_list, alias, request.user)
+    if not ingredients:
+        return HttpResponse(
+            renderer.render({'Ошибка': 'Список покупок пуст'}), status=400,
+            content_type='text/plain; charset=utf-8')
+    response = await sync_to_async(
+        render_shopping_list, thread_sensitive=False)(renderer, ingredients)
+    filename = f'{request.user.username}_shopping_list.{renderer.format}'
+    response['Content-Disposition'] = f'attachment; filename={filename}'
+    return response
@@ -0,0 +1,45 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework.authentication import TokenAuthentication
+
+TOKEN_KEY = 'auth-token:{}'
+USER_TOKEN_KEY = 'auth-token-user:{}'
+
+
+def token_digest(key):
+    '''В кеше токен хранится только в виде sha256.'''
+    return hashlib.sha256(key.encode()).hexdigest()
+
+
+def forget_token(key):
+    cache.delete(TOKEN_KEY.format(token_digest(key)))
+
+
+def forget_user(user_id):
+    '''Сброс токена пользователя без обращения к БД.'''
+    digest = cache.get(USER_TOKEN_KEY.format(user_id))
+    if digest is not None:
+        cache.delete_many((TOKEN_KEY.format(digest),
+                           USER_TOKEN_KEY.format(user_id)))
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    '''TokenAuthentication с кешем токена вместе с пользователем.
+
+    Запись живет AUTH_TOKEN_CACHE_TIMEOUT секунд и сбрасывается
+    при удалении токена (выход через auth/token/logout), а также
+    при сохранении и удалении пользователя (см. api.signals).
+    '''
+
+    def authenticate_credentials(self, key):
+        digest = token_digest(key)
+        token = cache.get(TOKEN_KEY.format(digest))
+        if token is None:
+            user, token = super().authenticate_credentials(key)
+            cache.set_many({
+                TOKEN_KEY.format(digest): token,
+                USER_TOKEN_KEY.format(user.pk): digest,
+            }, settings.AUTH_TOKEN_CACHE_TIMEOUT)
+        return token.user, token
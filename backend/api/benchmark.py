@@ -0,0 +1,346 @@
+'''Маршруты API с бюджетами SQL запросов и прогон замеров.
+
+Используется командой benchmark_api и тестами tests/test_benchmark.py.
+'''
+import base64
+import json
+import math
+import statistics
+import time
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.db import connections
+from django.test.utils import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.middleware import QueryStats, query_stats
+from recipes.counters import reconcile_counters
+from recipes.generate import (PASSWORD, PLACEHOLDER, PLACEHOLDER_NAME,
+                              DataGenerator)
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            ShoppingCartTotal, Tag)
+from users.models import Follow
+
+User = get_user_model()
+
+PLACEHOLDER_URI = 'data:image/png;base64,' + base64.b64encode(
+    PLACEHOLDER).decode()
+EXPORT_CHUNK_SIZE = 500
+
+
+class Route:
+    '''Запрос к API и допустимое число SQL запросов.
+
+    url и data могут ссылаться на состояние прогона: url через
+    str.format, data - функцией от состояния. store сохраняет поле
+    ответа в состояние для следующих запросов.
+    '''
+
+    def __init__(self, name, method, url, budget, auth='user', data=None,
+                 status=200, format='json', store=None):
+        self.name = name
+        self.method = method
+        self.url = url
+        self.budget = budget
+        self.auth = auth
+        self.data = data
+        self.status = status
+        self.format = format
+        self.store = store
+
+    @property
+    def label(self):
+        return f'{self.method.upper()} {self.name} [{self.auth or "anon"}]'
+
+    def get_budget(self, state):
+        if callable(self.budget):
+            return self.budget(state)
+        return self.budget
+
+    def get_data(self, state):
+        if callable(self.data):
+            return self.data(state)
+        return self.data
+
+
+def new_user(state):
+    state['created_users'] += 1
+    number = state['created_users']
+    return {
+        'email': f'new{number}@example.com',
+        'username': f'new{number}',
+        'first_name': 'Новый',
+        'last_name': 'Пользователь',
+        'password': PASSWORD,
+    }
+
+
+def new_recipe(state):
+    return {
+        'name': 'Рецепт для замера',
+        'text': 'Описание',
+        'cooking_time': 10,
+        'tags': state['tags'][:2],
+        'ingredients': [
+            {'id': ingredient, 'amount': 100}
+            for ingredient in state['ingredients'][:5]
+        ],
+        'image': PLACEHOLDER_URI,
+    }
+
+
+def new_upload(state):
+    return {'image': ContentFile(PLACEHOLDER, name='placeholder.png')}
+
+
+def import_line(state):
+    return json.dumps({
+        'name': 'Импорт для замера',
+        'text': 'Описание',
+        'cooking_time': 5,
+        'author': state['email'],
+        'tags': ['breakfast'],
+        'ingredients': [{
+            'name': state['ingredient_name'],
+            'measurement_unit': state['ingredient_unit'],
+            'amount': 10,
+        }],
+        'image': PLACEHOLDER_NAME,
+    }, ensure_ascii=False)
+
+
+def export_budget(state):
+    '''Токен, пачки по 3 запроса и последний пустой запрос.'''
+    return 1 + 3 * math.ceil(Recipe.objects.count() / EXPORT_CHUNK_SIZE) + 1
+
+
+# Маршруты api/urls.py без замера: восстановление пароля, активация
+# и смена email отправляют письма, корень API - служебная страница.
+NOT_BENCHMARKED = frozenset({
+    'api-root',
+    'users-activation',
+    'users-resend-activation',
+    'users-reset-password',
+    'users-reset-password-confirm',
+    'users-reset-username',
+    'users-reset-username-confirm',
+    'users-set-username',
+})
+
+# Порядок важен: запросы, меняющие данные, идут парами
+# (добавить / удалить), чтобы каждый повтор начинался с того же
+# состояния.
+ROUTES = (
+    Route('users', 'get', '/api/users/?limit=6', 2, auth=None),
+    Route('users', 'get', '/api/users/?limit=6', 3),
+    Route('user', 'get', '/api/users/{author}/', 1, auth=None),
+    Route('users/me', 'get', '/api/users/me/', 1),
+    Route('users', 'post', '/api/users/', 4, auth=None, data=new_user,
+          status=201),
+    Route('users/set_password', 'post', '/api/users/set_password/', 2,
+          data={'current_password': PASSWORD, 'new_password': PASSWORD},
+          status=204),
+    Route('users/subscriptions', 'get',
+          '/api/users/subscriptions/?limit=6&recipes_limit=3', 4),
+    Route('users/subscribe', 'post', '/api/users/{author}/subscribe/', 8,
+          status=201),
+    Route('users/subscribe', 'delete', '/api/users/{author}/subscribe/', 5,
+          status=204),
+    Route('auth/token/logout', 'post', '/api/auth/token/logout/', 3,
+          status=204),
+    Route('auth/token/login', 'post', '/api/auth/token/login/', 5,
+          auth=None, data=lambda state: {
+              'email': state['email'], 'password': PASSWORD},
+          store=('token', 'auth_token')),
+    Route('tags', 'get', '/api/tags/', 1, auth=None),
+    Route('tags', 'get', '/api/tags/', 1),
+    Route('tag', 'get', '/api/tags/{tag}/', 1, auth=None),
+    Route('ingredients', 'get', '/api/ingredients/', 1, auth=None),
+    Route('ingredients?name', 'get', '/api/ingredients/?name=мол', 1,
+          auth=None),
+    Route('ingredient', 'get', '/api/ingredients/{ingredient}/', 1,
+          auth=None),
+    Route('recipes', 'get', '/api/recipes/?limit=6', 4, auth=None),
+    Route('recipes', 'get', '/api/recipes/?limit=6', 5),
+    Route('recipes?page', 'get', '/api/recipes/?limit=6&page=3', 5),
+    Route('recipes?cursor', 'get', '/api/recipes/?limit=6&cursor=', 4),
+    Route('recipes?tags', 'get',
+          '/api/recipes/?limit=6&tags=breakfast&tags=lunch', 5),
+    Route('recipes?author', 'get', '/api/recipes/?limit=6&author={author}',
+          5),
+    Route('recipes?is_favorited', 'get',
+          '/api/recipes/?limit=6&is_favorited=1', 5),
+    Route('recipes?is_in_shopping_cart', 'get',
+          '/api/recipes/?limit=6&is_in_shopping_cart=1', 5),
+    Route('recipes?ordering', 'get',
+          '/api/recipes/?limit=6&ordering=-favorites', 5),
+    Route('recipes/feed', 'get', '/api/recipes/feed/?limit=6', 4,
+          store=('feed_next', 'next')),
+    Route('recipes/feed?cursor', 'get', '{feed_next}', 4),
+    Route('recipe', 'get', '/api/recipes/{recipe}/', 3, auth=None),
+    Route('recipe', 'get', '/api/recipes/{recipe}/', 4),
+    Route('recipes/images', 'post', '/api/recipes/images/', 2,
+          data=new_upload, format='multipart', status=201),
+    Route('recipes', 'post', '/api/recipes/', 14, data=new_recipe,
+          status=201, store=('own_recipe', 'id')),
+    Route('recipe', 'patch', '/api/recipes/{own_recipe}/', 13,
+          data=lambda state: dict(new_recipe(state), name='Изменен')),
+    Route('recipe', 'delete', '/api/recipes/{own_recipe}/', 16,
+          status=204),
+    Route('recipe/favorite', 'post', '/api/recipes/{recipe}/favorite/', 6,
+          status=201),
+    Route('recipe/favorite', 'delete', '/api/recipes/{recipe}/favorite/',
+          4, status=204),
+    Route('recipe/shopping_cart', 'post',
+          '/api/recipes/{recipe}/shopping_cart/', 10, status=201),
+    Route('download_shopping_cart?format=txt', 'get',
+          '/api/recipes/download_shopping_cart/?format=txt', 2),
+    Route('download_shopping_cart?format=csv', 'get',
+          '/api/recipes/download_shopping_cart/?format=csv', 2),
+    Route('download_shopping_cart?format=pdf', 'get',
+          '/api/recipes/download_shopping_cart/?format=pdf', 2),
+    Route('recipe/shopping_cart', 'delete',
+          '/api/recipes/{recipe}/shopping_cart/', 9, status=204),
+    Route('recipes/bulk', 'get', '/api/recipes/bulk/', export_budget,
+          auth='admin'),
+    Route('recipes/bulk', 'post', '/api/recipes/bulk/', 10, auth='admin',
+          data=import_line, format='ndjson', status=201),
+    Route('async/recipes', 'get', '/api/async/recipes/?limit=6', 5,
+          auth=None),
+    Route('async/recipes', 'get', '/api/async/recipes/?limit=6', 8),
+    Route('async/recipe', 'get', '/api/async/recipes/{recipe}/', 6),
+    Route('async/tags', 'get', '/api/async/tags/', 1, auth=None),
+    Route('async/tag', 'get', '/api/async/tags/{tag}/', 1, auth=None),
+    Route('async/ingredients', 'get', '/api/async/ingredients/', 1,
+          auth=None),
+    Route('async/ingredients?name', 'get',
+          '/api/async/ingredients/?name=мол', 1, auth=None),
+    Route('async/ingredient', 'get',
+          '/api/async/ingredients/{ingredient}/', 1, auth=None),
+    Route('async/download_shopping_cart?format=txt', 'get',
+          '/api/async/recipes/download_shopping_cart/?format=txt', 2),
+)
+
+
+def seed(users, recipes, seed):
+    '''Набор данных для замеров, возвращает состояние прогона.
+
+    Данные создает DataGenerator, первый пользователь становится
+    администратором, второй - пользователем замеров с гарантированными
+    избранным, корзиной и подписками.
+    '''
+    DataGenerator(users=users, recipes=recipes, ingredients=1500,
+                  seed=seed).run()
+    people = list(User.objects.order_by('pk')[:12])
+    admin, user = people[0], people[1]
+    User.objects.filter(pk=admin.pk).update(is_staff=True, is_superuser=True)
+    recipe_ids = list(Recipe.objects.order_by('pk').values_list(
+        'pk', flat=True)[:25])
+    Favorite.objects.bulk_create(
+        (Favorite(user=user, recipe_id=recipe)
+         for recipe in recipe_ids[:20]), ignore_conflicts=True)
+    ShoppingCart.objects.bulk_create(
+        (ShoppingCart(user=user, recipe_id=recipe)
+         for recipe in recipe_ids[20:]), ignore_conflicts=True)
+    Follow.objects.bulk_create(
+        (Follow(user=user, author=author) for author in people[2:]),
+        ignore_conflicts=True)
+    ShoppingCartTotal.objects.refresh([user])
+    reconcile_counters()
+    author = User.objects.exclude(
+        pk=user.pk).exclude(following__user=user).filter(
+        recipes_count__gt=0).order_by('-recipes_count', 'pk').first()
+    recipe = Recipe.objects.exclude(author=user).exclude(
+        favorite__user=user).exclude(shopping_cart__user=user).first()
+    tags = list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+    ingredients = list(Ingredient.objects.order_by('pk'))
+    return {
+        'created_users': 0,
+        'email': user.email,
+        'token': Token.objects.create(user=user).key,
+        'admin_token': Token.objects.create(user=admin).key,
+        'author': author.pk,
+        'recipe': recipe.pk,
+        'tag': tags[0],
+        'tags': tags,
+        'ingredient': ingredients[0].pk,
+        'ingredients': [ingredient.pk for ingredient in ingredients],
+        'ingredient_name': ingredients[0].name,
+        'ingredient_unit': ingredients[0].measurement_unit,
+    }
+
+
+def client(route, state):
+    client = APIClient()
+    if route.auth == 'user':
+        client.credentials(HTTP_AUTHORIZATION=f'Token {state["token"]}')
+    elif route.auth == 'admin':
+        client.credentials(
+            HTTP_AUTHORIZATION=f'Token {state["admin_token"]}')
+    return client
+
+
+def request(route, state):
+    data = route.get_data(state)
+    kwargs = {}
+    if route.format == 'ndjson':
+        kwargs = {'data': data, 'content_type': 'application/x-ndjson'}
+    elif data is not None:
+        kwargs = {'data': data, 'format': route.format}
+    url = route.url.format(**state)
+    # Асинхронные views выполняют запросы в своем пуле потоков и
+    # учитывают их в query_stats; замер middleware отключен, чтобы он
+    # не подменил счетчик.
+    stats = QueryStats()
+    token = query_stats.set(stats)
+    try:
+        with override_settings(PERFORMANCE_SAMPLE_RATE=0.0), \
+                ExitStack() as stack:
+            for db in connections.all():
+                stack.enter_context(db.execute_wrapper(stats))
+            start = time.perf_counter()
+            response = getattr(client(route, state), route.method)(
+                url, **kwargs)
+            if response.streaming:
+                content = b''.join(response.streaming_content)
+            else:
+                content = response.content
+            elapsed = time.perf_counter() - start
+    finally:
+        query_stats.reset(token)
+    if route.store and response.status_code == route.status:
+        key, field = route.store
+        state[key] = response.data[field]
+    return response.status_code, stats.count, elapsed, len(content)
+
+
+def run(state, repeat):
+    '''Все маршруты repeat раз подряд: время - медиана, запросы -
+    максимум; errors - превышения бюджета и неожиданные статусы.'''
+    results = [
+        {'route': route.label, 'budget': 0, 'queries': 0, 'times': [],
+         'size': 0, 'errors': []}
+        for route in ROUTES
+    ]
+    for _ in range(repeat):
+        for route, result in zip(ROUTES, results):
+            budget = route.get_budget(state)
+            status, queries, elapsed, size = request(route, state)
+            result['budget'] = max(result['budget'], budget)
+            result['queries'] = max(result['queries'], queries)
+            result['times'].append(elapsed)
+            result['size'] = size
+            if status != route.status:
+                result['errors'].append(
+                    f'статус {status}, ожидался {route.status}')
+            if queries > budget:
+                result['errors'].append(
+                    f'{queries} запросов при бюджете {budget}')
+    for result in results:
+        result['time_ms'] = round(
+            statistics.median(result.pop('times')) * 1000, 1)
+        result['errors'] = sorted(set(result['errors']))
+    return results
@@ -0,0 +1,35 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+from django.core.exceptions import ImproperlyConfigured
+
+LOCMEM_CACHE = 'django.core.cache.backends.locmem.LocMemCache'
+
+
+def local_cache_error():
+    '''Кеш в памяти процесса вне DEBUG.
+
+    В нем хранятся версии данных, отозванные токены и "липкость" к
+    default; gunicorn и backend_async - разные процессы, и каждый
+    видел бы только свои изменения.
+    '''
+    if settings.DEBUG or settings.CACHES['default']['BACKEND'] != LOCMEM_CACHE:
+        return None
+    return Error(
+        'LocMemCache не разделяется между процессами приложения.',
+        hint='Укажите общий кеш: CACHE_LOCATION=memcached:11211.',
+        id='api.E001',
+    )
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    error = local_cache_error()
+    return [error] if error else []
+
+
+def require_shared_cache():
+    '''Точки входа WSGI и ASGI не запускаются без общего кеша:
+    gunicorn и uvicorn системные проверки не выполняют.'''
+    error = local_cache_error()
+    if error:
+        raise ImproperlyConfigured(f'{error.msg} {error.hint}')
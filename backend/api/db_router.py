@@ -0,0 +1,100 @@
+'''Чтение с реплик БД для безопасных запросов API.
+
+Реплика выбирается на время запроса (ReplicaReadMixin), роутер
+отправляет на нее чтения, записи всегда идут в default. После
+успешного изменения данных пользователь REPLICA_STICKY_SECONDS
+читает с default, чтобы видеть свои записи, пока реплики догоняют.
+'''
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+STICKY_KEY = 'db-sticky:{}'
+
+read_alias = ContextVar('read_alias', default=None)
+# Реплика -> время (time.monotonic), до которого в этом процессе она
+# считается недоступной (_down_until) или проверенной (_checked_until).
+_down_until = {}
+_checked_until = {}
+
+
+def is_healthy(alias):
+    '''Реплика отвечает на SELECT 1.
+
+    Django 3.2 не проверяет постоянные соединения (CONN_MAX_AGE) перед
+    использованием, и ensure_connection не замечает оборванное
+    соединение, поэтому выполняется настоящий запрос, не чаще раза в
+    REPLICA_CHECK_SECONDS. При ошибке соединение закрывается, и на
+    REPLICA_RETRY_SECONDS чтения уходят в default.
+    '''
+    now = time.monotonic()
+    if _down_until.get(alias, 0) > now:
+        return False
+    if _checked_until.get(alias, 0) > now:
+        return True
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+    except DatabaseError:
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+        _checked_until.pop(alias, None)
+        _down_until[alias] = now + settings.REPLICA_RETRY_SECONDS
+        return False
+    _checked_until[alias] = now + settings.REPLICA_CHECK_SECONDS
+    return True
+
+
+def choose_replica(user):
+    if not settings.REPLICA_DATABASES:
+        return None
+    if user.is_authenticated and cache.get(STICKY_KEY.format(user.pk)):
+        return None
+    replicas = list(settings.REPLICA_DATABASES)
+    random.shuffle(replicas)
+    return next((alias for alias in replicas if is_healthy(alias)), None)
+
+
+def stick_to_primary(user):
+    if settings.REPLICA_DATABASES and user.is_authenticated:
+        cache.set(STICKY_KEY.format(user.pk), True,
+                  settings.REPLICA_STICKY_SECONDS)
+
+
+@contextmanager
+def read_from_primary():
+    '''Чтения внутри блока идут в default.
+
+    Для данных, которые кешируются под текущей версией: версию
+    увеличивает коммит в default, и строки с отстающей реплики
+    попали бы в кеш под новой версией.
+    '''
+    token = read_alias.set(None)
+    try:
+        yield
+    finally:
+        read_alias.reset(token)
+
+
+class ReplicaRouter:
+    '''Чтения - на реплику запроса (если выбрана), записи - в default.'''
+
+    def db_for_read(self, model, **hints):
+        return read_alias.get()
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        return db == DEFAULT_DB_ALIAS
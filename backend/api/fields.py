@@ -0,0 +1,118 @@
+import base64
+import binascii
+import re
+import uuid
+from tempfile import SpooledTemporaryFile
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.fields import SkipField
+
+DATA_URI = re.compile(r'^data:image/(?P<subtype>[\w.+-]+);base64,')
+# Кратно 4, чтобы каждая часть декодировалась независимо.
+DECODE_CHUNK_SIZE = 4 * 256 * 1024
+IMAGE_FORMATS = {
+    'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp',
+}
+
+
+class Base64ImageField(serializers.ImageField):
+    '''Картинка в виде data:image/...;base64,... строки.
+
+    Строка декодируется частями во временный файл (в памяти до
+    1 МБ), размер ограничен RECIPE_IMAGE_MAX_SIZE, формат и
+    целостность проверяются Pillow до создания рецепта.
+    '''
+    default_error_messages = {
+        'invalid_base64': 'Картинка должна быть data:image/...;base64 '
+                          'строкой.',
+        'too_large': 'Размер картинки превышает {max_size} байт.',
+        'invalid_format': 'Допустимые форматы: JPEG, PNG, GIF, WebP.',
+    }
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) and data.startswith('http'):
+            raise SkipField()
+        if isinstance(data, str):
+            data = self.decode(data)
+        return super().to_internal_value(data)
+
+    def decode(self, data):
+        match = DATA_URI.match(data)
+        if match is None:
+            self.fail('invalid_base64')
+        max_size = settings.RECIPE_IMAGE_MAX_SIZE
+        if (len(data) - match.end()) * 3 // 4 > max_size + 2:
+            self.fail('too_large', max_size=max_size)
+        file = SpooledTemporaryFile(max_size=1024 * 1024)
+        try:
+            for start in range(match.end(), len(data), DECODE_CHUNK_SIZE):
+                file.write(base64.b64decode(
+                    data[start:start + DECODE_CHUNK_SIZE], validate=True))
+        except (binascii.Error, ValueError):
+            file.close()
+            self.fail('invalid_base64')
+        size = file.tell()
+        file.seek(0)
+        extension = self.check_image(file)
+        return UploadedFile(
+            file, name=f'{uuid.uuid4()}.{extension}',
+            content_type=f'image/{extension}', size=size)
+
+    def check_image(self, file):
+        try:
+            with Image.open(file) as image:
+                image_format = image.format
+                image.verify()
+        except (OSError, SyntaxError, Image.DecompressionBombError):
+            file.close()
+            self.fail('invalid_image')
+        if image_format not in IMAGE_FORMATS:
+            file.close()
+            self.fail('invalid_format')
+        file.seek(0)
+        return IMAGE_FORMATS[image_format]
+
+
+class RecipeImageVariantField(serializers.ImageField):
+    '''URL варианта картинки с откатом на исходную картинку.'''
+
+    def __init__(self, variant, **kwargs):
+        self.variant = variant
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        image = getattr(recipe, self.variant) or recipe.image
+        return super().to_representation(image)
+
+
+class RecipeSrcsetField(serializers.Field):
+    '''Значение srcset из готовых вариантов картинки.
+
+    Ширина - фактическая ширина варианта, записанная при его
+    построении (recipes.images.build_variants), чтобы не читать файлы
+    при выдаче. Варианты без записанной ширины пропускаются.
+    '''
+
+    def __init__(self, **kwargs):
+        kwargs['read_only'] = True
+        kwargs['source'] = '*'
+        super().__init__(**kwargs)
+
+    def to_representation(self, recipe):
+        request = self.context.get('request')
+        candidates = []
+        for field in ('image_thumb', 'image_webp'):
+            image = getattr(recipe, field)
+            width = getattr(recipe, f'{field}_width')
+            if not image or not width:
+                continue
+            url = image.url
+            if request is not None:
+                url = request.build_absolute_uri(url)
+            candidates.append(f'{url} {width}w')
+        return ', '.join(candidates)
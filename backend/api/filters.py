@@ -1,42 +1,66 @@
-from django.contrib.auth import get_user_model
-from django_filters import ModelMultipleChoiceFilter
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
 
-from recipes.models import Ingredient, Recipe, Tag
-
-User = get_user_model()
+from api.search import search_ingredients
+from recipes.models import (Favorite, Ingredient, Recipe, ShoppingCart,
+                            TagsInRecipe)
 
 
 class IngredientFilter(FilterSet):
-    name = filters.CharFilter(field_name='name', lookup_expr='startswith')
+    name = filters.CharFilter(method='filter_name')
+
+    def filter_name(self, queryset, name, value):
+        return search_ingredients(queryset, value)
 
     class Meta:
         model = Ingredient
         fields = ('name',)
 
 
+class RecipeOrderingFilter(filters.OrderingFilter):
+    '''Сортировка, дополненная порядком по умолчанию.
+
+    Равные значения счетчиков упорядочиваются по названию и id,
+    чтобы страницы выдачи не пересекались.
+    '''
+
+    def filter(self, qs, value):
+        qs = super().filter(qs, value)
+        if value:
+            qs = qs.order_by(*qs.query.order_by, *Recipe._meta.ordering)
+        return qs
+
+
 class RecipeFilter(FilterSet):
-    tags = ModelMultipleChoiceFilter(
-        field_name='tags__slug',
-        to_field_name='slug',
-        queryset=Tag.objects.all()
-    )
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    '''Фильтры рецептов.
+
+    Каждый фильтр добавляет к входящему queryset условие EXISTS,
+    поэтому фильтры сочетаются друг с другом и не дают дублей.
+    '''
+    tags = filters.CharFilter(method='filter_tags')
+    author = filters.NumberFilter(field_name='author_id')
     is_favorited = filters.BooleanFilter(method='filter_favorited')
     is_in_shopping_cart = filters.BooleanFilter(method='filter_shopping_cart')
+    ordering = RecipeOrderingFilter(fields=(('favorites_count', 'favorites'),))
 
-    def filter_favorited(self, queryset, name, value):
-        user = self.request.user
-        if value and user.is_authenticated:
-            return Recipe.objects.filter(favorite__user=user)
-        return Recipe.objects.all()
+    def filter_tags(self, queryset, name, value):
+        '''Рецепты с любым из тегов ?tags=a&tags=b.'''
+        return queryset.filter(Exists(TagsInRecipe.objects.filter(
+            recipe=OuterRef('pk'), tag__slug__in=self.data.getlist(name))))
 
-    def filter_shopping_cart(self, queryset, name, value):
+    def filter_user_relation(self, queryset, model, value):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk'))))
         return queryset
 
+    def filter_favorited(self, queryset, name, value):
+        return self.filter_user_relation(queryset, Favorite, value)
+
+    def filter_shopping_cart(self, queryset, name, value):
+        return self.filter_user_relation(queryset, ShoppingCart, value)
+
     class Meta:
         model = Recipe
         fields = ('author', 'tags', 'is_favorited', 'is_in_shopping_cart',)
@@ -0,0 +1,76 @@
+import json
+import shutil
+import tempfile
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.benchmark import run, seed
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер всех маршрутов API на тестовой базе: число SQL запросов, '
+        'время и размер ответа. Ошибка при превышении бюджета запросов.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=200)
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument(
+            '--repeat', type=int, default=3,
+            help='Число повторов; время - медиана, запросы - максимум.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', help='Сохранить отчет в файл.')
+
+    def handle(self, **options):
+        if options['users'] < 12 or options['recipes'] < 25:
+            raise CommandError('Нужно хотя бы 12 пользователей и 25 рецептов.')
+        media_root = tempfile.mkdtemp(prefix='benchmark-media-')
+        old_name = connection.settings_dict['NAME']
+        try:
+            with override_settings(
+                MEDIA_ROOT=media_root,
+                RECIPE_IMAGE_WORKERS=0,
+                # Запросы считаются по default, реплики не используются.
+                REPLICA_DATABASES=[],
+                CACHES={'default': {
+                    'BACKEND':
+                        'django.core.cache.backends.locmem.LocMemCache',
+                    'LOCATION': 'benchmark',
+                }},
+            ):
+                connection.creation.create_test_db(
+                    verbosity=0, autoclobber=True, serialize=False)
+                state = seed(
+                    options['users'], options['recipes'], options['seed'])
+                results = run(state, options['repeat'])
+        finally:
+            if connection.settings_dict['NAME'] != old_name:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+            shutil.rmtree(media_root, ignore_errors=True)
+        self.report(results)
+        if options['json']:
+            with open(options['json'], 'w', encoding='utf-8') as file:
+                json.dump(results, file, ensure_ascii=False, indent=2)
+        failed = [result for result in results if result['errors']]
+        if failed:
+            raise CommandError(
+                f'Маршрутов с превышением бюджета или ошибкой: {len(failed)}.')
+
+    def report(self, results):
+        width = max(len(result['route']) for result in results)
+        self.stdout.write(
+            f'{"Маршрут":<{width}}  запросы  бюджет  мс       байт')
+        for result in results:
+            line = (
+                f'{result["route"]:<{width}}  {result["queries"]:>7}  '
+                f'{result["budget"]:>6}  {result["time_ms"]:>7}  '
+                f'{result["size"]:>8}'
+            )
+            if result['errors']:
+                self.stdout.write(self.style.ERROR(
+                    f'{line}  {"; ".join(result["errors"])}'))
+            else:
+                self.stdout.write(line)
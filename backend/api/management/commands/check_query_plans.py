@@ -0,0 +1,53 @@
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from api.query_plans import main_queries, seq_scans
+from recipes.models import Ingredient, Recipe, Tag
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = (
+        'EXPLAIN основных запросов API на текущей базе (только '
+        'PostgreSQL). Ошибка, если запрос читает большую таблицу '
+        'последовательным сканированием. В CI то же проверяет '
+        'tests/test_query_plans.py на собственных данных.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', help='Email пользователя для персональных запросов.')
+        parser.add_argument(
+            '--show-plans', action='store_true', help='Печатать планы.')
+
+    def handle(self, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Проверка планов работает только с PostgreSQL.')
+        users = User.objects.order_by('pk')
+        if options['user']:
+            users = users.filter(email=options['user'])
+        user = users.first()
+        tag = Tag.objects.order_by('pk').values_list('slug', flat=True).first()
+        ingredient = Ingredient.objects.order_by('pk').values_list(
+            'name', flat=True).first()
+        if None in (user, tag, ingredient) or not Recipe.objects.exists():
+            raise CommandError('Нет данных: заполните базу, например '
+                               'командой generate_data.')
+        failed = []
+        for name, queryset in main_queries(user, tag, ingredient).items():
+            plan, scans = seq_scans(queryset)
+            if options['show_plans']:
+                self.stdout.write(f'{name}\n{plan}\n')
+            if scans:
+                failed.append(name)
+                self.stdout.write(self.style.ERROR(
+                    f'{name}: Seq Scan on {", ".join(sorted(scans))}'))
+            else:
+                self.stdout.write(f'{name}: OK')
+        if failed:
+            raise CommandError(
+                f'Последовательное сканирование в запросах: {len(failed)}.')
+        self.stdout.write(
+            self.style.SUCCESS('Все запросы используют индексы.'))
@@ -0,0 +1,177 @@
+import logging
+import random
+import re
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+
+logger = logging.getLogger('api.performance')
+
+# Списки параметров IN (%s, %s, ...) разной длины дают один отпечаток.
+PARAMS_LIST = re.compile(r'\((?:%s, )+%s\)')
+
+# QueryStats замеряемого запроса для кода, который выполняет запросы
+# к БД в других потоках (см. api.async_views.database).
+query_stats = ContextVar('query_stats', default=None)
+
+
+def fingerprint(sql):
+    return PARAMS_LIST.sub('(%s, ...)', sql)
+
+
+class QueryStats:
+    '''Обертка execute_wrapper: число запросов, время БД, отпечатки.'''
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        self.fingerprints = Counter()
+        self.slow = []
+        self.lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            duration = time.perf_counter() - started
+            with self.lock:
+                self.count += 1
+                self.duration += duration
+                self.fingerprints[fingerprint(sql)] += 1
+                if duration * 1000 >= settings.PERFORMANCE_SLOW_QUERY_MS:
+                    self.slow.append((duration, sql))
+
+
+@contextmanager
+def measure(request, name):
+    '''Время блока без запросов к БД в request._performance[name].
+
+    Запросы внутри блока (например, prefetch при промахе кеша)
+    остаются во времени db. Для незамеренных запросов ничего не
+    делает.
+    '''
+    performance = getattr(request, '_performance', None)
+    if performance is None:
+        yield
+        return
+    stats = query_stats.get()
+    db = stats.duration if stats is not None else 0.0
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        if stats is not None:
+            elapsed -= stats.duration - db
+        performance[name] += max(elapsed, 0.0)
+
+
+class PerformanceMiddleware:
+    '''Замер времени запроса: БД, код view, сериализация, рендеринг.
+
+    Замеряется доля PERFORMANCE_SAMPLE_RATE запросов, остальные
+    проходят без накладных расходов. Для замеренных запросов
+    добавляется заголовок Server-Timing, в лог api.performance
+    пишутся медленные запросы, медленные SQL запросы и повторяющиеся
+    отпечатки SQL (признак N+1). Время serializer.data (serialize)
+    замеряют views через measure (см. api.mixins.SerializeTimingMixin),
+    app - остальной код view без БД.
+    '''
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            # Обработчик Django распознает middleware как async.
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return self.get_response(request)
+        stats, started = self.start(request)
+        token = query_stats.set(stats)
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(stats))
+                response = self.get_response(request)
+        finally:
+            query_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    async def __acall__(self, request):
+        '''ASGI: соединения из цикла событий не трогаются, запросы
+        учитываются там, где их выполняют (api.async_views.database).'''
+        if random.random() >= settings.PERFORMANCE_SAMPLE_RATE:
+            return await self.get_response(request)
+        stats, started = self.start(request)
+        token = query_stats.set(stats)
+        try:
+            response = await self.get_response(request)
+        finally:
+            query_stats.reset(token)
+        return self.finish(request, response, stats, started)
+
+    def start(self, request):
+        request._performance = {'render': 0.0, 'serialize': 0.0}
+        return QueryStats(), time.perf_counter()
+
+    def finish(self, request, response, stats, started):
+        total = time.perf_counter() - started
+        render = request._performance['render']
+        serialize = request._performance['serialize']
+        timings = {
+            'db': stats.duration,
+            'app': max(total - render - serialize - stats.duration, 0.0),
+            'serialize': serialize,
+            'render': render,
+            'total': total,
+        }
+        response['Server-Timing'] = ', '.join(
+            f'{name};dur={duration * 1000:.1f}'
+            for name, duration in timings.items()
+        ) + f', queries;desc="{stats.count}"'
+        self.report(request, response, stats, timings)
+        return response
+
+    def process_template_response(self, request, response):
+        '''Время рендеринга Response DRF (до и после render()).'''
+        if not hasattr(request, '_performance'):
+            return response
+        started = time.perf_counter()
+
+        def rendered(response):
+            request._performance['render'] += time.perf_counter() - started
+
+        response.add_post_render_callback(rendered)
+        return response
+
+    def report(self, request, response, stats, timings):
+        match = request.resolver_match
+        view = match.view_name if match else request.path
+        total_ms = timings['total'] * 1000
+        if total_ms >= settings.PERFORMANCE_SLOW_REQUEST_MS:
+            logger.warning(
+                'Медленный запрос %s %s (%s): %.0f мс, БД %.0f мс, '
+                'запросов %d, статус %d',
+                request.method, request.path, view, total_ms,
+                timings['db'] * 1000, stats.count, response.status_code)
+        for duration, sql in stats.slow:
+            logger.warning('Медленный SQL в %s: %.0f мс: %s',
+                           view, duration * 1000, sql)
+        for sql, count in stats.fingerprints.items():
+            if count >= settings.PERFORMANCE_DUPLICATE_QUERIES:
+                logger.warning('Повторяющийся SQL в %s: %d раз: %s',
+                               view, count, sql)
@@ -0,0 +1,140 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import urlencode
+from rest_framework.permissions import SAFE_METHODS
+
+from api.db_router import (choose_replica, read_alias, read_from_primary,
+                           stick_to_primary)
+from api.middleware import measure
+from recipes.cache import get_version
+
+# Формат ответа и путь входят в ключ как хеш: в ключах memcached
+# нельзя пробелы ("application/json; indent=4"), длина - до 250 байт.
+RESPONSE_KEY = 'response:{namespace}:{version}:{digest}'
+
+
+class ReplicaReadMixin:
+    '''Чтение с реплики для GET / HEAD / OPTIONS запросов.
+
+    replica_actions ограничивает действия, которым можно читать с
+    реплики (None - всем безопасным). Реплика выбирается после
+    аутентификации, чтобы учесть "липкость" пользователя к default
+    после его изменений (см. api.db_router).
+    '''
+    replica_actions = None
+
+    def dispatch(self, request, *args, **kwargs):
+        token = read_alias.set(None)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            read_alias.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and (
+            self.replica_actions is None
+            or self.action in self.replica_actions
+        ):
+            read_alias.set(choose_replica(request.user))
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            stick_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
+
+
+class CachedResponseMixin:
+    '''Кеширование готовых ответов справочников.
+
+    Ответ list / retrieve рендерится один раз на версию данных
+    cache_namespace (см. recipes.cache) и отдается с сильным ETag;
+    If-None-Match с тем же ETag получает 304. В ключ входят путь и
+    только параметры из cache_params в заданном порядке: остальные
+    параметры на ответ не влияют и не плодят записи в кеше.
+    '''
+    cache_namespace = None
+    cache_params = ()
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedResponseMixin, self).list(
+                request, *args, **kwargs))
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            request, lambda: super(CachedResponseMixin, self).retrieve(
+                request, *args, **kwargs))
+
+    def render(self, response):
+        response.accepted_renderer = self.request.accepted_renderer
+        response.accepted_media_type = self.request.accepted_media_type
+        response.renderer_context = self.get_renderer_context()
+        response.render()
+        return response
+
+    def cache_path(self, request):
+        query = urlencode([
+            (name, value) for name in self.cache_params
+            for value in request.query_params.getlist(name)
+        ])
+        return f'{request.path}?{query}' if query else request.path
+
+    def cached_response(self, request, build_response):
+        key = RESPONSE_KEY.format(
+            namespace=self.cache_namespace,
+            version=get_version(self.cache_namespace),
+            digest=hashlib.sha256('{} {}'.format(
+                request.accepted_media_type, self.cache_path(request),
+            ).encode()).hexdigest(),
+        )
+        cached = cache.get(key)
+        if cached is None:
+            with read_from_primary():
+                response = build_response()
+            if response.status_code != 200:
+                return response
+            content = self.render(response).content
+            etag = '"{}"'.format(hashlib.sha256(content).hexdigest()[:32])
+            cached = (content, response['Content-Type'], etag)
+            cache.set(key, cached, settings.REFERENCE_CACHE_TIMEOUT)
+        content, content_type, etag = cached
+        if_none_match = request.headers.get('If-None-Match', '')
+        if etag in (tag.strip() for tag in if_none_match.split(',')):
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content, content_type=content_type)
+        response['ETag'] = etag
+        patch_cache_control(
+            response, public=True, max_age=settings.REFERENCE_CACHE_MAX_AGE)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class SerializeTimingMixin:
+    '''Время serializer.data для Server-Timing (serialize).
+
+    Замеряется to_representation сериализатора верхнего уровня
+    (вложенные входят в него) из get_serializer; сериализаторы,
+    созданные во view напрямую, передаются через timed. Только для
+    запросов, которые замеряет api.middleware.PerformanceMiddleware.
+    '''
+
+    def get_serializer(self, *args, **kwargs):
+        return self.timed(super().get_serializer(*args, **kwargs))
+
+    def timed(self, serializer):
+        if not hasattr(self.request, '_performance'):
+            return serializer
+        represent = serializer.to_representation
+
+        def to_representation(instance):
+            with measure(self.request, 'serialize'):
+                return represent(instance)
+
+        serializer.to_representation = to_representation
+        return serializer
@@ -0,0 +1,18 @@
+from rest_framework.negotiation import DefaultContentNegotiation
+
+
+class FormatParamNegotiation(DefaultContentNegotiation):
+    '''Формат выбирается только через ?format= (или суффикс URL).
+
+    Заголовок Accept не учитывается: без ?format= отдается первый
+    рендерер, и клиенты с Accept: application/json получают файл, как
+    до появления форматов, а не 406.
+    '''
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        format = format_suffix or request.query_params.get(
+            self.settings.URL_FORMAT_OVERRIDE)
+        if format:
+            renderers = self.filter_renderers(renderers, format)
+        renderer = renderers[0]
+        return renderer, renderer.media_type
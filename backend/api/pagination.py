@@ -1,6 +1,203 @@
-from rest_framework.pagination import PageNumberPagination
+import base64
+import binascii
+import json
+from collections import OrderedDict
+from functools import reduce
+from operator import or_
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import BigIntegerField, Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    '''Постраничный вывод по ключу последней записи (keyset).
+
+    Сортировка берется из queryset (или Meta.ordering) и дополняется
+    pk, курсор хранит значения этих полей у последней записи страницы.
+    Нет COUNT(*) и OFFSET, поэтому глубокие страницы не медленнее первых.
+    '''
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def __init__(self, page_size):
+        self.page_size = page_size
+
+    @staticmethod
+    def get_ordering(queryset):
+        ordering = list(
+            queryset.query.order_by or queryset.model._meta.ordering)
+        if not {'pk', 'id', '-pk', '-id'} & set(ordering):
+            ordering.append('pk')
+        return ordering
+
+    def encode_cursor(self, values):
+        data = json.dumps(values, cls=DjangoJSONEncoder).encode()
+        return base64.urlsafe_b64encode(data).decode()
+
+    def decode_cursor(self, cursor, size):
+        try:
+            values = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        except (binascii.Error, UnicodeDecodeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        if not isinstance(values, list) or len(values) != size:
+            raise NotFound(self.invalid_cursor_message)
+        return values
+
+    @staticmethod
+    def get_field(model, name):
+        '''Поле модели по пути сортировки (None - не поле модели).'''
+        field = None
+        for attr in name.split('__'):
+            if model is None:
+                return None
+            try:
+                field = (model._meta.pk if attr == 'pk'
+                         else model._meta.get_field(attr))
+            except FieldDoesNotExist:
+                return None
+            model = field.related_model
+        return field
+
+    def clean_cursor(self, model, values):
+        '''Значения курсора приводятся к типам полей сортировки.
+
+        Курсор приходит от клиента: значение другого типа или вне
+        диапазона поля - это неверный курсор (404), а не ошибка 500.
+        '''
+        cleaned = []
+        for field_name, value in zip(self.ordering, values):
+            field = self.get_field(model, field_name.lstrip('-'))
+            if field is not None:
+                if value is None and not field.null:
+                    raise NotFound(self.invalid_cursor_message)
+                try:
+                    value = field.to_python(value)
+                    field.run_validators(value)
+                except (TypeError, ValidationError):
+                    raise NotFound(self.invalid_cursor_message)
+                # Диапазон целых проверяется не всеми СУБД (SQLite).
+                if (isinstance(value, int)
+                        and abs(value) > BigIntegerField.MAX_BIGINT):
+                    raise NotFound(self.invalid_cursor_message)
+            cleaned.append(value)
+        return cleaned
+
+    @staticmethod
+    def after(ordering, values):
+        '''Условие "строго после" для лексикографического ключа.'''
+        conditions = []
+        for position, field in enumerate(ordering):
+            name = field.lstrip('-')
+            lookup = 'lt' if field.startswith('-') else 'gt'
+            condition = Q(**{f'{name}__{lookup}': values[position]})
+            for previous, value in zip(ordering[:position], values):
+                condition &= Q(**{previous.lstrip('-'): value})
+            conditions.append(condition)
+        return reduce(or_, conditions)
+
+    @staticmethod
+    def get_value(obj, field):
+        for attr in field.lstrip('-').split('__'):
+            obj = getattr(obj, attr)
+        return obj
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.ordering = self.get_ordering(queryset)
+        queryset = queryset.order_by(*self.ordering)
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor:
+            values = self.clean_cursor(queryset.model, self.decode_cursor(
+                cursor, len(self.ordering)))
+            try:
+                queryset = queryset.filter(self.after(self.ordering, values))
+            except (TypeError, ValueError, ValidationError):
+                raise NotFound(self.invalid_cursor_message)
+        page = list(queryset[:self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        self.page = page[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        last = self.page[-1]
+        cursor = self.encode_cursor(
+            [self.get_value(last, field) for field in self.ordering])
+        return replace_query_param(
+            self.request.build_absolute_uri(),
+            self.cursor_query_param, cursor)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', None),
+            ('results', data),
+        ]))
+
+
+class FeedPagination(KeysetPagination):
+    '''Курсор ленты подписок: ключ (created_at, id) последнего рецепта.
+
+    Время в курсоре хранится с микросекундами (DjangoJSONEncoder
+    отбрасывает их), иначе рецепты одной миллисекунды терялись бы.
+    '''
+
+    def decode_feed_cursor(self, cursor):
+        created_at, pk = self.decode_cursor(cursor, 2)
+        try:
+            created_at = parse_datetime(created_at)
+        except (TypeError, ValueError):
+            created_at = None
+        if created_at is None or not isinstance(pk, int):
+            raise NotFound(self.invalid_cursor_message)
+        return created_at, pk
+
+    def paginate_feed(self, queryset, request, user):
+        '''Страница ленты: ключи из queryset.feed, рецепты из queryset.'''
+        self.request = request
+        cursor = request.query_params.get(self.cursor_query_param)
+        keys = queryset.feed(
+            user, self.page_size + 1,
+            self.decode_feed_cursor(cursor) if cursor else None)
+        self.has_next = len(keys) > self.page_size
+        self.keys = keys[:self.page_size]
+        recipes = queryset.in_bulk([pk for _, pk in self.keys])
+        self.page = [recipes[pk] for _, pk in self.keys if pk in recipes]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        created_at, pk = self.keys[-1]
+        return replace_query_param(
+            self.request.build_absolute_uri(), self.cursor_query_param,
+            self.encode_cursor([created_at.isoformat(), pk]))
 
 
 class LimitPagination(PageNumberPagination):
+    '''Постраничный вывод с ?limit=.
+
+    С параметром ?cursor= (в том числе пустым для первой страницы)
+    включается KeysetPagination.
+    '''
     page_size_query_param = 'limit'
     page_size = 6
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if KeysetPagination.cursor_query_param in request.query_params:
+            self.keyset = KeysetPagination(self.get_page_size(request))
+            return self.keyset.paginate_queryset(queryset, request, view)
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        return super().get_paginated_response(data)
@@ -0,0 +1,59 @@
+import re
+from types import SimpleNamespace
+
+from django.http import QueryDict
+
+from api.filters import RecipeFilter
+from api.search import search_indexed
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, TagsInRecipe)
+from users.models import Follow, feed_recipes
+
+SEQ_SCAN = re.compile(r'Seq Scan on (\w+)')
+# Справочники малы и читаются целиком.
+SMALL_TABLES = {'recipes_tag'}
+
+
+def main_queries(user, tag, ingredient):
+    '''Основные запросы эндпоинтов, как их строят views.
+
+    tag - slug тега для фильтра, ingredient - строка поиска
+    ингредиентов; обе берутся из данных базы.
+    '''
+    recipes = Recipe.objects.for_display(user)
+    recipe_ids = list(recipes.values_list('pk', flat=True)[:6])
+    filtered = RecipeFilter(
+        QueryDict(f'tags={tag}&is_favorited=1&author={user.pk}'),
+        queryset=recipes,
+        request=SimpleNamespace(user=user),
+    ).qs
+    subscriptions = Follow.objects.subscriptions_of(user)[:6]
+    return {
+        'recipes: list': recipes[:6],
+        'recipes: filters': filtered[:6],
+        'recipes: detail': recipes.filter(pk=recipe_ids[0]),
+        'recipes: ingredient prefetch':
+            IngredientAmount.objects.filter(recipe__in=recipe_ids),
+        'recipes: tag prefetch':
+            TagsInRecipe.objects.filter(recipe__in=recipe_ids),
+        'recipes: favorite add':
+            Favorite.objects.filter(user=user, recipe=recipe_ids[0]),
+        'recipes: cart add':
+            ShoppingCart.objects.filter(user=user, recipe=recipe_ids[0]),
+        'recipes: download_shopping_cart':
+            user.shopping_cart_totals.values(
+                'ingredient__name', 'ingredient__measurement_unit',
+                'amount').order_by('ingredient__name'),
+        'users: subscriptions': subscriptions,
+        'users: subscription recipes': feed_recipes(
+            [follow.author_id for follow in subscriptions], 3),
+        'users: followers': Follow.objects.filter(author=user),
+        'ingredients: search':
+            search_indexed(Ingredient.objects.all(), ingredient, 50),
+    }
+
+
+def seq_scans(queryset):
+    '''План запроса и большие таблицы, которые он читает целиком.'''
+    plan = queryset.explain()
+    return plan, set(SEQ_SCAN.findall(plan)) - SMALL_TABLES
@@ -0,0 +1,131 @@
+import csv
+import io
+import os
+from abc import ABCMeta, abstractmethod
+
+from django.conf import settings
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfbase import pdfmetrics
+from reportlab.pdfbase.ttfonts import TTFont
+from reportlab.pdfgen import canvas
+from rest_framework.renderers import BaseRenderer
+
+SHOPPING_LIST_TITLE = 'Список покупок'
+
+
+class ShoppingListRenderer(BaseRenderer, metaclass=ABCMeta):
+    '''Базовый формат выгрузки списка покупок.
+
+    Строки списка отдаются потоково через stream(), render()
+    используется только для ответов с ошибками.
+    '''
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        '''Ошибки отдаются простым текстом в любом формате.'''
+        response = (renderer_context or {}).get('response')
+        if response is not None:
+            response['Content-Type'] = 'text/plain; charset=utf-8'
+        if isinstance(data, dict):
+            data = '\n'.join(f'{key}: {value}' for key, value in data.items())
+        return str(data or '').encode('utf-8')
+
+    @property
+    def content_type(self):
+        if self.charset:
+            return f'{self.media_type}; charset={self.charset}'
+        return self.media_type
+
+    @staticmethod
+    def as_line(ingredient):
+        return (
+            ingredient['ingredient__name'],
+            ingredient['ingredient__measurement_unit'],
+            ingredient['amount'],
+        )
+
+    @abstractmethod
+    def stream(self, ingredients):
+        '''Генератор частей файла по строкам списка.'''
+
+
+class TextShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/plain'
+    format = 'txt'
+
+    def stream(self, ingredients):
+        yield f'{SHOPPING_LIST_TITLE}\n\n'
+        for ingredient in ingredients:
+            name, unit, amount = self.as_line(ingredient)
+            yield f'- {name} ({unit}) - {amount}\n'
+
+
+class Echo:
+    '''Буфер для csv.writer, возвращающий записанную строку.'''
+
+    def write(self, value):
+        return value
+
+
+class CSVShoppingListRenderer(ShoppingListRenderer):
+    media_type = 'text/csv'
+    format = 'csv'
+
+    def stream(self, ingredients):
+        writer = csv.writer(Echo())
+        yield writer.writerow(('Ингредиент', 'Единицы измерения',
+                               'Количество'))
+        for ingredient in ingredients:
+            yield writer.writerow(self.as_line(ingredient))
+
+
+class PDFShoppingListRenderer(ShoppingListRenderer):
+    '''Выгрузка в PDF.
+
+    PDF нельзя отдавать частями до построения таблицы ссылок,
+    поэтому документ собирается целиком и отдается одним блоком.
+    '''
+    media_type = 'application/pdf'
+    format = 'pdf'
+    charset = None
+    font_size = 12
+    margin = 50
+
+    @staticmethod
+    def get_font():
+        '''Шрифт с кириллицей, если он есть в системе.'''
+        font_path = settings.SHOPPING_LIST_PDF_FONT
+        if not font_path or not os.path.isfile(font_path):
+            return 'Helvetica'
+        if 'ShoppingListFont' not in pdfmetrics.getRegisteredFontNames():
+            pdfmetrics.registerFont(TTFont('ShoppingListFont', font_path))
+        return 'ShoppingListFont'
+
+    def stream(self, ingredients):
+        buffer = io.BytesIO()
+        font = self.get_font()
+        _, height = A4
+        line_height = self.font_size * 1.5
+        pdf = canvas.Canvas(buffer, pagesize=A4)
+        pdf.setTitle(SHOPPING_LIST_TITLE)
+        pdf.setFont(font, self.font_size + 4)
+        pdf.drawString(self.margin, height - self.margin, SHOPPING_LIST_TITLE)
+        pdf.setFont(font, self.font_size)
+        y = height - self.margin - line_height * 2
+        for ingredient in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            name, unit, amount = self.as_line(ingredient)
+            pdf.drawString(self.margin, y, f'- {name} ({unit}) - {amount}')
+            y -= line_height
+        pdf.save()
+        yield buffer.getvalue()
+
+
+SHOPPING_LIST_RENDERERS = (
+    TextShoppingListRenderer,
+    CSVShoppingListRenderer,
+    PDFShoppingListRenderer,
+)
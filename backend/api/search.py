@@ -0,0 +1,116 @@
+import threading
+from bisect import bisect_left
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.db.models import Case, IntegerField, Value, When
+
+from recipes.cache import get_version
+from recipes.models import Ingredient
+
+SEARCH_LIMIT = 50
+
+
+def search_ingredients(queryset, value, limit=SEARCH_LIMIT):
+    '''Поиск ингредиентов: сначала по началу названия, затем по вхождению.
+
+    На PostgreSQL поиск обслуживает индекс pg_trgm из миграции
+    0005_ingredient_search. Результат - срез, поэтому поиск
+    применяется только к списку, а не к get_object.
+    '''
+    if connections[queryset.db].vendor == 'postgresql':
+        return search_indexed(queryset, value, limit)
+    return search_fallback(queryset, value, limit)
+
+
+def search_indexed(queryset, value, limit):
+    '''Одно условие icontains (индекс pg_trgm) с рангом: совпадения
+    с начала названия идут первыми.'''
+    return queryset.filter(name__icontains=value).annotate(
+        rank=Case(
+            When(name__istartswith=value, then=Value(0)),
+            default=Value(1),
+            output_field=IntegerField(),
+        ),
+    ).order_by('rank', 'name')[:limit]
+
+
+def search_fallback(queryset, value, limit):
+    '''Поиск без индексов для SQLite, где LIKE не различает
+    регистр только для латиницы.'''
+    value = value.casefold()
+    prefix, contains = [], []
+    for pk, name in queryset.order_by('name').values_list('pk', 'name'):
+        name = name.casefold()
+        if name.startswith(value):
+            prefix.append(pk)
+        elif value in name:
+            contains.append(pk)
+    found = (prefix + contains)[:limit]
+    return queryset.filter(pk__in=found).order_by(Case(
+        *(When(pk=pk, then=position) for position, pk in enumerate(found)),
+        output_field=IntegerField(),
+    ))
+
+
+class IngredientIndex:
+    '''Индекс названий ингредиентов в памяти процесса.
+
+    Хранит отсортированные нормализованные названия и строки для
+    ответа; префикс ищется бинарным поиском. Индекс загружается при
+    первом запросе и перечитывается, когда меняется версия
+    'ingredients' в общем кеше (см. recipes.signals). Названия и
+    строки публикуются одним присваиванием entries, чтобы поиск во
+    время перезагрузки не сопоставил новые названия со старыми
+    строками.
+    '''
+
+    def __init__(self):
+        self.version = None
+        self.entries = ([], [])
+        self.lock = threading.Lock()
+
+    def load(self, version):
+        # Версия уже новая, а реплика может отставать: читается default.
+        entries = sorted(
+            (name.casefold(), pk, name, measurement_unit)
+            for pk, name, measurement_unit in Ingredient.objects.using(
+                DEFAULT_DB_ALIAS).values_list(
+                    'pk', 'name', 'measurement_unit')
+        )
+        keys = [entry[0] for entry in entries]
+        rows = [
+            {'id': pk, 'name': name, 'measurement_unit': measurement_unit}
+            for _, pk, name, measurement_unit in entries
+        ]
+        self.entries = (keys, rows)
+        self.version = version
+
+    def refresh(self):
+        version = get_version('ingredients')
+        if version != self.version:
+            with self.lock:
+                if version != self.version:
+                    self.load(version)
+
+    def search(self, value, limit=SEARCH_LIMIT):
+        '''Те же правила, что у search_ingredients, без запросов к БД.'''
+        self.refresh()
+        keys, rows = self.entries
+        value = value.casefold()
+        start = position = bisect_left(keys, value)
+        found = []
+        while (position < len(keys) and len(found) < limit
+               and keys[position].startswith(value)):
+            found.append(rows[position])
+            position += 1
+        for index, key in enumerate(keys):
+            if len(found) >= limit:
+                break
+            if start <= index < position:
+                continue
+            if value in key:
+                found.append(rows[index])
+        return found
+
+
+ingredient_index = IngredientIndex()
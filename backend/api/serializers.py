@@ -1,13 +1,26 @@
+import uuid
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from drf_base64.fields import Base64ImageField
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, models, transaction
 from rest_framework import serializers
 from rest_framework.validators import ValidationError
 
-from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from api.db_router import read_from_primary
+from api.fields import (IMAGE_FORMATS, Base64ImageField,
+                        RecipeImageVariantField, RecipeSrcsetField)
+from recipes.cache import AUTHOR_VERSION, RECIPE_VERSION, get_versions
+from recipes.models import (ImageUpload, Ingredient, IngredientAmount, Recipe,
+                            Tag)
+from recipes.totals import refresh_totals_on_commit
 from users.models import Follow
 
 User = get_user_model()
 
+RECIPE_DATA_KEY = ('recipe-data:{pk}:{recipe}:{author}:{tags}:{ingredients}:'
+                   '{host}')
+
 
 class CustomUserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -30,43 +43,6 @@ class CustomUserSerializer(serializers.ModelSerializer):
         return user
 
 
-class FollowSerializer(serializers.ModelSerializer):
-    email = serializers.ReadOnlyField(source='author.email')
-    id = serializers.ReadOnlyField(source='author.id')
-    username = serializers.ReadOnlyField(source='author.username')
-    first_name = serializers.ReadOnlyField(source='author.first_name')
-    last_name = serializers.ReadOnlyField(source='author.last_name')
-    recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.ReadOnlyField(source='author.recipes.count')
-    is_subscribed = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Follow
-        fields = (
-            'email', 'id', 'username', 'first_name', 'last_name',
-            'is_subscribed', 'recipes', 'recipes_count'
-        )
-
-    def get_is_subscribed(self, obj):
-        '''Статус подписки на автора.'''
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and Follow.objects.filter(
-                author=obj.author, user=request.user).exists()
-        )
-
-    def get_recipes(self, obj):
-        '''Получение списка рецептов автора.'''
-        limit = self.context.get('request').GET.get('recipes_limit')
-        recipe_obj = obj.author.recipes.all()
-        if limit:
-            recipe_obj = recipe_obj[:int(limit)]
-        serializer = ShortRecipeSerializer(recipe_obj, many=True)
-        return serializer.data
-
-
 class TagSerializer(serializers.ModelSerializer):
     class Meta:
         model = Tag
@@ -96,7 +72,8 @@ class IngredientAmountSerializer(serializers.ModelSerializer):
 
 
 class ShortRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField()
+    '''Краткий рецепт, картинка отдается миниатюрой.'''
+    image = RecipeImageVariantField('image_thumb')
 
     class Meta:
         model = Recipe
@@ -104,75 +81,267 @@ class ShortRecipeSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'name', 'image', 'cooking_time',)
 
 
+class FollowSerializer(serializers.ModelSerializer):
+    '''Подписка на автора.
+
+    Ожидает объекты из Follow.objects.subscriptions_of(user) после
+    prefetch_feed_recipes.
+    '''
+    email = serializers.ReadOnlyField(source='author.email')
+    id = serializers.ReadOnlyField(source='author.id')
+    username = serializers.ReadOnlyField(source='author.username')
+    first_name = serializers.ReadOnlyField(source='author.first_name')
+    last_name = serializers.ReadOnlyField(source='author.last_name')
+    recipes = ShortRecipeSerializer(
+        source='author.feed_recipes', many=True, read_only=True)
+    recipes_count = serializers.ReadOnlyField(source='author.recipes_count')
+    is_subscribed = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Follow
+        fields = (
+            'email', 'id', 'username', 'first_name', 'last_name',
+            'is_subscribed', 'recipes', 'recipes_count'
+        )
+
+    def get_is_subscribed(self, obj):
+        '''Статус подписки на автора.
+
+        Сериализуются только подписки текущего пользователя,
+        поэтому отдельный запрос не нужен.
+        '''
+        request = self.context.get('request')
+        return bool(request and obj.user_id == request.user.id)
+
+
 class ShowRecipeSerializer(serializers.ModelSerializer):
+    '''Рецепт для выдачи.
+
+    Ожидает queryset из Recipe.objects.for_display(user): флаги
+    is_favorited / is_in_shopping_cart берутся из аннотаций,
+    теги и ингредиенты - из prefetch.
+    '''
     tags = TagSerializer(read_only=True, many=True)
     image = Base64ImageField()
+    image_thumb = RecipeImageVariantField('image_thumb')
+    srcset = RecipeSrcsetField()
     author = CustomUserSerializer(read_only=True)
-    ingredients = serializers.SerializerMethodField('get_ingredients')
-    is_favorited = serializers.SerializerMethodField('get_is_favorited')
-    is_in_shopping_cart = serializers.SerializerMethodField(
-        'get_is_in_shopping_cart')
+    ingredients = IngredientAmountSerializer(
+        source='ingredientamount_set', many=True, read_only=True)
+    is_favorited = serializers.BooleanField(read_only=True)
+    is_in_shopping_cart = serializers.BooleanField(read_only=True)
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
-                  'is_in_shopping_cart', 'name', 'image', 'text',
-                  'cooking_time',)
+                  'is_in_shopping_cart', 'name', 'image', 'image_thumb',
+                  'srcset', 'text', 'cooking_time',)
 
-    def get_ingredients(self, obj):
-        ingredients = IngredientAmount.objects.filter(recipe=obj)
-        return IngredientAmountSerializer(ingredients, many=True).data
 
-    def get_is_favorited(self, obj):
-        request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and request.user.favorite.filter(recipe=obj).exists()
-        )
+class CachedRecipeListSerializer(serializers.ListSerializer):
+    '''Список рецептов: кеш читается одним get_many на страницу.'''
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, models.Manager) else data
+        return self.child.represent(list(recipes))
+
+
+class CachedRecipeSerializer(ShowRecipeSerializer):
+    '''Рецепт для выдачи с кешем представлений.
+
+    Часть представления, общая для всех пользователей, кешируется по
+    id рецепта и версиям рецепта, автора, тегов и ингредиентов
+    (см. recipes.signals), а также хосту запроса - в ней абсолютные
+    URL картинок. Флаги is_favorited / is_in_shopping_cart берутся из
+    аннотаций запроса. Ожидает queryset
+    Recipe.objects.select_related('author').with_user_flags(user),
+    теги и ингредиенты загружаются только для рецептов не из кеша,
+    из default.
+    '''
 
-    def get_is_in_shopping_cart(self, obj):
+    class Meta(ShowRecipeSerializer.Meta):
+        list_serializer_class = CachedRecipeListSerializer
+
+    def to_representation(self, instance):
+        return self.represent([instance])[0]
+
+    def cache_keys(self, recipes):
         request = self.context.get('request')
-        return (
-            request
-            and request.user.is_authenticated
-            and request.user.shopping_cart.filter(recipe=obj).exists()
-        )
+        host = request.build_absolute_uri('/') if request else ''
+        versions = get_versions(
+            {RECIPE_VERSION.format(recipe.pk) for recipe in recipes}
+            | {AUTHOR_VERSION.format(recipe.author_id) for recipe in recipes}
+            | {'tags', 'ingredients'})
+        return {
+            recipe.pk: RECIPE_DATA_KEY.format(
+                pk=recipe.pk,
+                recipe=versions[RECIPE_VERSION.format(recipe.pk)],
+                author=versions[AUTHOR_VERSION.format(recipe.author_id)],
+                tags=versions['tags'],
+                ingredients=versions['ingredients'],
+                host=host,
+            )
+            for recipe in recipes
+        }
+
+    @staticmethod
+    def load_from_primary(recipes):
+        '''Рецепты, прочитанные с реплики, перечитываются из default.
+
+        Ключи кеша строятся по версиям, которые увеличивает коммит в
+        default; строки отстающей реплики сохранились бы под новой
+        версией. Удаленные в default рецепты остаются как есть.
+        '''
+        stale = [
+            recipe.pk for recipe in recipes
+            if recipe._state.db != DEFAULT_DB_ALIAS]
+        if not stale:
+            return recipes
+        primary = Recipe.objects.using(DEFAULT_DB_ALIAS).select_related(
+            'author').in_bulk(stale)
+        for recipe in recipes:
+            if recipe.pk in primary:
+                primary[recipe.pk].is_favorited = recipe.is_favorited
+                primary[recipe.pk].is_in_shopping_cart = (
+                    recipe.is_in_shopping_cart)
+        return [primary.get(recipe.pk, recipe) for recipe in recipes]
+
+    def represent(self, recipes):
+        keys = self.cache_keys(recipes)
+        cached = cache.get_many(keys.values())
+        missing = [
+            recipe for recipe in recipes if keys[recipe.pk] not in cached]
+        if missing:
+            with read_from_primary():
+                missing = self.load_from_primary(missing)
+                models.prefetch_related_objects(
+                    missing, *Recipe.objects.related_prefetches())
+                fresh = {
+                    keys[recipe.pk]: super(
+                        CachedRecipeSerializer, self).to_representation(
+                            recipe)
+                    for recipe in missing
+                }
+            cache.set_many(fresh, settings.RECIPE_CACHE_TIMEOUT)
+            cached.update(fresh)
+        data = []
+        for recipe in recipes:
+            representation = cached[keys[recipe.pk]].copy()
+            representation['is_favorited'] = recipe.is_favorited
+            representation['is_in_shopping_cart'] = (
+                recipe.is_in_shopping_cart)
+            data.append(representation)
+        return data
 
 
 class AddIngredientToRecipeSerializer(serializers.ModelSerializer):
-    id = serializers.PrimaryKeyRelatedField(
-        queryset=Ingredient.objects.all()
-    )
+    id = serializers.IntegerField()
 
     class Meta:
         model = IngredientAmount
         fields = ('id', 'amount',)
 
 
+class ImageUploadSerializer(serializers.ModelSerializer):
+    '''Загрузка картинки файлом, без base64.'''
+
+    class Meta:
+        model = ImageUpload
+        fields = ('token', 'image',)
+        read_only_fields = ('token',)
+
+    def validate_image(self, image):
+        '''Проверка размера и формата, имя файла задается сервером.'''
+        if image.size > settings.RECIPE_IMAGE_MAX_SIZE:
+            raise ValidationError(
+                f'Размер картинки превышает '
+                f'{settings.RECIPE_IMAGE_MAX_SIZE} байт.')
+        extension = IMAGE_FORMATS.get(image.image.format)
+        if extension is None:
+            raise ValidationError('Допустимые форматы: JPEG, PNG, GIF, WebP.')
+        image.name = f'{uuid.uuid4()}.{extension}'
+        return image
+
+
 class CreateRecipeSerializer(serializers.ModelSerializer):
-    image = Base64ImageField(max_length=None, use_url=True)
+    '''Создание и изменение рецепта.
+
+    Картинка передается base64 строкой в image или токеном
+    предварительной загрузки в image_token.
+    '''
+    image = Base64ImageField(max_length=None, use_url=True, required=False)
+    image_token = serializers.UUIDField(write_only=True, required=False)
     author = CustomUserSerializer(read_only=True)
     ingredients = AddIngredientToRecipeSerializer(many=True, write_only=True)
     cooking_time = serializers.IntegerField()
-    tags = serializers.PrimaryKeyRelatedField(
-        many=True, queryset=Tag.objects.all()
-    )
+    tags = serializers.ListField(child=serializers.IntegerField())
 
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
-                  'name', 'image', 'text', 'cooking_time',)
+                  'name', 'image', 'image_token', 'text', 'cooking_time',)
 
     @staticmethod
     def create_ingredient_amount(valid_ingredients, recipe):
         '''Добавление ингредиентов'''
-        for ingredient in valid_ingredients:
-            ingredient_model = ingredient['id']
-            amount = ingredient['amount']
-            IngredientAmount.objects.create(
-                ingredient=ingredient_model, recipe=recipe, amount=amount
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(
+                ingredient_id=ingredient['id'],
+                recipe=recipe,
+                amount=ingredient['amount'],
             )
+            for ingredient in valid_ingredients
+        )
+
+    @staticmethod
+    def update_ingredient_amount(valid_ingredients, recipe):
+        '''Обновление только изменившихся ингредиентов.
+
+        Возвращает id ингредиентов, которые были добавлены,
+        удалены или изменили количество.
+        '''
+        current = {
+            ingredient_amount.ingredient_id: ingredient_amount
+            for ingredient_amount in recipe.ingredientamount_set.all()
+        }
+        amounts = {
+            ingredient['id']: ingredient['amount']
+            for ingredient in valid_ingredients
+        }
+        removed = current.keys() - amounts.keys()
+        added = [
+            ingredient for ingredient in valid_ingredients
+            if ingredient['id'] not in current
+        ]
+        changed = [
+            ingredient_amount
+            for ingredient_id, ingredient_amount in current.items()
+            if ingredient_id in amounts
+            and ingredient_amount.amount != amounts[ingredient_id]
+        ]
+        if removed:
+            recipe.ingredientamount_set.filter(
+                ingredient_id__in=removed).delete()
+        for ingredient_amount in changed:
+            ingredient_amount.amount = amounts[ingredient_amount.ingredient_id]
+        IngredientAmount.objects.bulk_update(changed, ('amount',))
+        CreateRecipeSerializer.create_ingredient_amount(added, recipe)
+        return (
+            removed
+            | {ingredient['id'] for ingredient in added}
+            | {ingredient_amount.ingredient_id
+               for ingredient_amount in changed}
+        )
+
+    @staticmethod
+    def validate_ids(ids, model, message):
+        '''Проверка существования всех id одним запросом.'''
+        found = set(
+            model.objects.filter(id__in=ids).values_list('id', flat=True))
+        missing = set(ids) - found
+        if missing:
+            raise ValidationError(
+                f'{message}: {", ".join(map(str, sorted(missing)))}.')
 
     def validate_cooking_time(self, data):
         '''Валидация времени приготовления.'''
@@ -183,31 +352,58 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
 
     def validate_ingredients(self, data):
         '''Валидация ингредиентов.'''
-        ingredients = self.initial_data.get('ingredients')
-        if not ingredients:
+        if not data:
             raise ValidationError(
                 'Хотя бы один ингредиент должен быть указан.'
             )
         unique_ingredient = set()
-        for ingredient in ingredients:
+        for ingredient in data:
             if ingredient['id'] in unique_ingredient:
                 raise ValidationError('Нельзя дублировать ингредиенты.')
             unique_ingredient.add(ingredient['id'])
-            if int(ingredient['amount']) < 1:
+            if ingredient['amount'] < 1:
                 raise ValidationError('Количество не может быть менее 1.')
+        self.validate_ids(
+            unique_ingredient, Ingredient, 'Несуществующие ингредиенты')
         return data
 
     def validate_tags(self, data):
         '''Валидация тегов.'''
-        tags = self.initial_data.get('tags', False)
-        if not tags:
+        if not data:
             raise ValidationError('Хотя бы один тэг должен быть указан.')
-        if len(set(tags)) != len(tags):
+        if len(set(data)) != len(data):
             raise ValidationError('Нельзя дублировать теги.')
+        self.validate_ids(data, Tag, 'Несуществующие теги')
         return data
 
+    def validate_image_token(self, token):
+        '''Загрузка должна принадлежать текущему пользователю.'''
+        upload = ImageUpload.objects.filter(
+            token=token, user=self.context.get('request').user).first()
+        if upload is None:
+            raise ValidationError('Загруженная картинка не найдена.')
+        return upload
+
+    def validate(self, data):
+        if 'image' in data and 'image_token' in data:
+            raise ValidationError('Укажите либо image, либо image_token.')
+        if self.instance is None and not (
+                'image' in data or 'image_token' in data):
+            raise ValidationError({'image': 'Обязательное поле.'})
+        return data
+
+    @staticmethod
+    def use_upload(validated_data):
+        '''Файл загрузки переходит рецепту, сама загрузка удаляется.'''
+        upload = validated_data.pop('image_token', None)
+        if upload is not None:
+            validated_data['image'] = upload.image.name
+            upload.delete()
+
+    @transaction.atomic
     def create(self, validated_data):
         '''Создание рецепта.'''
+        self.use_upload(validated_data)
         valid_ingredients = validated_data.pop('ingredients')
         tags_data = validated_data.pop('tags')
         author = self.context.get('request').user
@@ -216,15 +412,24 @@ class CreateRecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags_data)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
         '''Обновление рецепта.'''
-        tags_data = validated_data.pop('tags')
-        valid_ingredients = validated_data.pop('ingredients')
-        instance.tags.clear()
-        instance.tags.set(tags_data)
-        instance.ingredients.clear()
-        self.create_ingredient_amount(valid_ingredients, instance)
+        self.use_upload(validated_data)
+        tags_data = validated_data.pop('tags', None)
+        valid_ingredients = validated_data.pop('ingredients', None)
+        if tags_data is not None:
+            instance.tags.set(tags_data)
+        if valid_ingredients is not None:
+            changed = self.update_ingredient_amount(
+                valid_ingredients, instance)
+            if changed:
+                # bulk_create / bulk_update не отправляют сигналы.
+                refresh_totals_on_commit(
+                    recipe=instance.pk, ingredients=changed)
         return super().update(instance, validated_data)
 
     def to_representation(self, instance):
+        user = self.context.get('request').user
+        instance = Recipe.objects.for_display(user).get(pk=instance.pk)
         return ShowRecipeSerializer(instance, context=self.context).data
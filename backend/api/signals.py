@@ -0,0 +1,18 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import forget_token, forget_user
+
+User = get_user_model()
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    forget_token(instance.key)
+
+
+@receiver((post_save, post_delete), sender=User)
+def user_changed(instance, **kwargs):
+    forget_user(instance.pk)
@@ -1,6 +1,7 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
+from api import async_views
 from api.views import (CustomUserViewSet, IngredientsViewSet, RecipeViewSet,
                        TagViewSet)
 
@@ -12,7 +13,23 @@ router.register('recipes', RecipeViewSet, basename='recipes')
 router.register('tags', TagViewSet, basename='tags')
 router.register('ingredients', IngredientsViewSet, basename='ingredients')
 
+async_urlpatterns = [
+    path('recipes/', async_views.recipe_list, name='async-recipes-list'),
+    path('recipes/download_shopping_cart/',
+         async_views.download_shopping_cart,
+         name='async-recipes-download-shopping-cart'),
+    path('recipes/<int:pk>/', async_views.recipe_detail,
+         name='async-recipes-detail'),
+    path('tags/', async_views.tag_list, name='async-tags-list'),
+    path('tags/<int:pk>/', async_views.tag_detail, name='async-tags-detail'),
+    path('ingredients/', async_views.ingredient_list,
+         name='async-ingredients-list'),
+    path('ingredients/<int:pk>/', async_views.ingredient_detail,
+         name='async-ingredients-detail'),
+]
+
 urlpatterns = [
+    path('async/', include(async_urlpatterns)),
     path('', include(router.urls)),
     path('', include('djoser.urls')),
     path('auth/', include('djoser.urls.authtoken')),
@@ -1,40 +1,57 @@
+from itertools import chain
+
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.db import transaction
+from django.http import StreamingHttpResponse
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import IsAuthenticated
+from rest_framework.parsers import FileUploadParser, MultiPartParser
+from rest_framework.permissions import IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
 from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import LimitPagination
+from api.mixins import (CachedResponseMixin, ReplicaReadMixin,
+                        SerializeTimingMixin)
+from api.negotiation import FormatParamNegotiation
+from api.pagination import FeedPagination, LimitPagination
 from api.permissions import AuthorOrReadOnly, ReadOnly
-from api.serializers import (CreateRecipeSerializer, FollowSerializer,
+from api.renderers import SHOPPING_LIST_RENDERERS
+from api.search import ingredient_index
+from api.serializers import (CachedRecipeSerializer, CreateRecipeSerializer,
+                             FollowSerializer, ImageUploadSerializer,
                              IngredientSerializer, ShortRecipeSerializer,
-                             ShowRecipeSerializer, TagSerializer)
-from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
-                            ShoppingCart, Tag)
-from users.models import Follow
+                             TagSerializer)
+from recipes.bulk import RecipeImporter, export_recipes
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from users.models import Follow, prefetch_feed_recipes
 
 User = get_user_model()
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(ReplicaReadMixin, SerializeTimingMixin, UserViewSet):
+    replica_actions = ('list',)
     queryset = User.objects.all()
     pagination_class = LimitPagination
 
+    def with_recipes(self, follows):
+        '''Подписки с первыми рецептами авторов (?recipes_limit=).'''
+        limit = self.request.query_params.get('recipes_limit')
+        return prefetch_feed_recipes(
+            follows, int(limit) if limit and limit.isdigit() else None)
+
     @action(detail=False, url_path='subscriptions',
             url_name='subscriptions', permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
         '''Подписки.'''
-        user = request.user
-        queryset = user.follower.all()
-        pages = self.paginate_queryset(queryset)
-        serializer = FollowSerializer(
-            pages, many=True, context={'request': request})
+        pages = self.paginate_queryset(
+            Follow.objects.subscriptions_of(request.user))
+        serializer = self.timed(FollowSerializer(
+            self.with_recipes(pages), many=True,
+            context={'request': request}))
         return self.get_paginated_response(serializer.data)
 
     @action(methods=['post', 'delete'], detail=True, url_path='subscribe',
@@ -53,25 +70,33 @@ class CustomUserViewSet(UserViewSet):
                 return Response(
                     'Вы уже подписаны', status=status.HTTP_400_BAD_REQUEST
                 )
-            queryset = Follow.objects.create(author=author, user=user)
-            serializer = FollowSerializer(
-                queryset, context={'request': request})
+            # Счетчик меняет post_save - в той же транзакции.
+            with transaction.atomic():
+                subscription = Follow.objects.create(author=author, user=user)
+            serializer = self.timed(FollowSerializer(
+                self.with_recipes([subscription])[0],
+                context={'request': request}))
             return Response(serializer.data, status=status.HTTP_201_CREATED)
-        if not follow.exists():
+        deleted, _ = follow.delete()
+        if not deleted:
             return Response(
                 {'Ошибка': 'Нельзя отписаться повторно'},
                 status=status.HTTP_400_BAD_REQUEST)
-        follow.delete()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
 
-class TagViewSet(viewsets.ReadOnlyModelViewSet):
+class TagViewSet(ReplicaReadMixin, CachedResponseMixin, SerializeTimingMixin,
+                 viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'tags'
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (ReadOnly,)
 
 
-class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
+class IngredientsViewSet(ReplicaReadMixin, CachedResponseMixin,
+                         SerializeTimingMixin, viewsets.ReadOnlyModelViewSet):
+    cache_namespace = 'ingredients'
+    cache_params = ('name',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     filter_backends = (DjangoFilterBackend,)
@@ -79,18 +104,39 @@ class IngredientsViewSet(viewsets.ReadOnlyModelViewSet):
     search_fields = ('name',)
     permission_classes = (ReadOnly,)
 
+    def filter_queryset(self, queryset):
+        '''Поиск ?name= только для списка: get_object ищет по pk.'''
+        if self.action != 'list':
+            return queryset
+        return super().filter_queryset(queryset)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name and settings.INGREDIENT_SEARCH_IN_MEMORY:
+            return Response(ingredient_index.search(name))
+        return super().list(request, *args, **kwargs)
+
+
+class RecipeViewSet(ReplicaReadMixin, SerializeTimingMixin,
+                    viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (AuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
     pagination_class = LimitPagination
+    # Выдача через CachedRecipeSerializer.
+    cached_actions = ('list', 'retrieve', 'feed')
+
+    def get_queryset(self):
+        if self.action in self.cached_actions:
+            return Recipe.objects.select_related('author').with_user_flags(
+                self.request.user)
+        return Recipe.objects.for_display(self.request.user)
 
     def get_serializer_class(self):
         if self.request.method in ['POST', 'PATCH']:
             return CreateRecipeSerializer
-        return ShowRecipeSerializer
+        return CachedRecipeSerializer
 
     def add_to(self, model, user, pk):
         '''Добавление рецепта в избранное / корзину.'''
@@ -98,15 +144,15 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return Response({'Ошибка': 'Рецепт уже добавлен'},
                             status=status.HTTP_400_BAD_REQUEST)
         recipe = get_object_or_404(Recipe, id=pk)
-        model.objects.create(user=user, recipe=recipe)
-        serializer = ShortRecipeSerializer(recipe)
+        with transaction.atomic():
+            model.objects.create(user=user, recipe=recipe)
+        serializer = self.timed(ShortRecipeSerializer(recipe))
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
     def delete_from(self, model, user, pk):
         '''Удаление рецепта из избранного / корзины.'''
-        obj = model.objects.filter(user=user, recipe__id=pk)
-        if obj.exists():
-            obj.delete()
+        deleted, _ = model.objects.filter(user=user, recipe__id=pk).delete()
+        if deleted:
             return Response(status=status.HTTP_204_NO_CONTENT)
         return Response({'Ошибка': 'Рецепт уже удален'},
                         status=status.HTTP_400_BAD_REQUEST)
@@ -131,34 +177,84 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return self.add_to(ShoppingCart, request.user, pk)
         return self.delete_from(ShoppingCart, request.user, pk)
 
+    @action(detail=False, permission_classes=[IsAuthenticated])
+    def feed(self, request):
+        '''Рецепты авторов из подписок, сначала новые (?cursor=, ?limit=).'''
+        paginator = FeedPagination(self.paginator.get_page_size(request))
+        page = paginator.paginate_feed(
+            self.get_queryset(), request, request.user)
+        serializer = self.get_serializer(page, many=True)
+        return paginator.get_paginated_response(serializer.data)
+
     def create_shopping_cart(self, ingredients, user):
-        '''Формирование корзины для скачивания.'''
-        shopping_list = ('Список покупок\n\n')
-        shopping_list += '\n'.join([
-            f'- {ingredient["ingredient__name"]} '
-            f'({ingredient["ingredient__measurement_unit"]})'
-            f' - {ingredient["amount"]}'
-            for ingredient in ingredients
-        ])
-        filename = f'{user.username}_shopping_list.txt'
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        '''Потоковая выгрузка корзины в выбранном формате.'''
+        renderer = self.request.accepted_renderer
+        filename = f'{user.username}_shopping_list.{renderer.format}'
+        response = StreamingHttpResponse(
+            renderer.stream(ingredients), content_type=renderer.content_type)
         response['Content-Disposition'] = f'attachment; filename={filename}'
         return response
 
     @action(
         detail=False,
-        permission_classes=[IsAuthenticated]
+        permission_classes=[IsAuthenticated],
+        renderer_classes=SHOPPING_LIST_RENDERERS,
+        content_negotiation_class=FormatParamNegotiation,
     )
     def download_shopping_cart(self, request):
-        '''Скачивание корзины.'''
-        user = request.user
-        if not user.shopping_cart.exists():
+        '''Скачивание корзины: ?format=txt|csv|pdf.'''
+        ingredients = request.user.shopping_cart_totals.values(
+            'ingredient__name',
+            'ingredient__measurement_unit',
+            'amount',
+        ).order_by('ingredient__name').iterator()
+        first = next(ingredients, None)
+        if first is None:
             return Response({'Ошибка': 'Список покупок пуст'},
                             status=status.HTTP_400_BAD_REQUEST)
-        ingredients = IngredientAmount.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(amount=Sum('amount'))
-        return self.create_shopping_cart(ingredients, user)
+        return self.create_shopping_cart(
+            chain((first,), ingredients), request.user)
+
+    @action(
+        detail=False,
+        methods=['post'],
+        url_path='images',
+        permission_classes=[IsAuthenticated],
+        parser_classes=(MultiPartParser, FileUploadParser),
+    )
+    def upload_image(self, request):
+        '''Загрузка картинки для image_token рецепта.
+
+        Multipart с полем image или файл в теле запроса с заголовком
+        Content-Disposition. Django пишет тело во временный файл
+        частями (FILE_UPLOAD_MAX_MEMORY_SIZE), без base64 и JSON.
+        '''
+        image = request.data.get('image', request.data.get('file'))
+        serializer = self.timed(ImageUploadSerializer(
+            data={'image': image}, context={'request': request}))
+        serializer.is_valid(raise_exception=True)
+        serializer.save(user=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    @action(
+        detail=False,
+        methods=['get', 'post'],
+        permission_classes=[IsAdminUser],
+    )
+    def bulk(self, request):
+        '''Пакетный экспорт / импорт рецептов в NDJSON.'''
+        if request.method == 'GET':
+            embed_images = request.query_params.get('images') == 'embed'
+            return StreamingHttpResponse(
+                export_recipes(embed_images=embed_images),
+                content_type='application/x-ndjson')
+        if request.stream is None:
+            return Response({'Ошибка': 'Пустое тело запроса'},
+                            status=status.HTTP_400_BAD_REQUEST)
+        importer = RecipeImporter(default_author=request.user.email).load(
+            request.stream)
+        return Response(
+            {'created': importer.created, 'errors': importer.errors,
+             'error_count': importer.error_count},
+            status=status.HTTP_201_CREATED if importer.created
+            else status.HTTP_400_BAD_REQUEST)
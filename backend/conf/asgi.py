@@ -11,6 +11,10 @@ import os
 
 from django.core.asgi import get_asgi_application
 
+from api.checks import require_shared_cache
+
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conf.settings')
 
 application = get_asgi_application()
+
+require_shared_cache()
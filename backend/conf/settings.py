@@ -36,6 +36,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'api.middleware.PerformanceMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -76,13 +77,59 @@ DATABASES = {
         'USER': os.getenv('POSTGRES_USER', 'django'),
         'PASSWORD': os.getenv('POSTGRES_PASSWORD', 'mysecretpassword'),
         'HOST': os.getenv('DB_HOST', 'db'),
-        'PORT': os.getenv('DB_PORT', 5432)
+        'PORT': os.getenv('DB_PORT', 5432),
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
     }
 }
 
+# Read replicas: DB_REPLICAS="host[:port], ..." with the same credentials.
+# Safe-method API reads are routed there by api.db_router.ReplicaRouter;
+# tests use the default database through TEST MIRROR.
+
+REPLICA_DATABASES = []
+for number, address in enumerate(
+    filter(None, map(str.strip, os.getenv('DB_REPLICAS', '').split(','))),
+    start=1,
+):
+    host, _, port = address.partition(':')
+    DATABASES[f'replica{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'PORT': port or DATABASES['default']['PORT'],
+        'TEST': {'MIRROR': 'default'},
+    }
+    REPLICA_DATABASES.append(f'replica{number}')
+
+DATABASE_ROUTERS = ['api.db_router.ReplicaRouter']
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 10))
+REPLICA_RETRY_SECONDS = int(os.getenv('REPLICA_RETRY_SECONDS', 30))
+REPLICA_CHECK_SECONDS = int(os.getenv('REPLICA_CHECK_SECONDS', 5))
+
+# Cache versions, token logout and replica stickiness must be shared by all
+# processes (gunicorn workers, backend_async): CACHE_LOCATION="host:port"
+# selects memcached. LocMemCache is per process and is refused outside DEBUG
+# (see api.checks).
+
+CACHE_LOCATION = os.getenv('CACHE_LOCATION', '')
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv('CACHE_BACKEND', (
+            'django.core.cache.backends.memcached.PyMemcacheCache'
+            if CACHE_LOCATION
+            else 'django.core.cache.backends.locmem.LocMemCache'
+        )),
+        'LOCATION': CACHE_LOCATION,
+    }
+}
+if CACHES['default']['BACKEND'].endswith('.LocMemCache'):
+    # The default 300 entries hold only a few pages of recipes.
+    CACHES['default']['OPTIONS'] = {
+        'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000)),
+    }
+
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend'
@@ -91,6 +138,15 @@ REST_FRAMEWORK = {
 
 AUTH_USER_MODEL = 'users.User'
 
+# The covering index on IngredientAmount (INCLUDE amount) is PostgreSQL-only;
+# other backends build it without the non-key column.
+
+SILENCED_SYSTEM_CHECKS = ['models.W040']
+
+# Token -> user lookups cached by api.authentication.CachedTokenAuthentication
+
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+
 DJOSER = {
     'HIDE_USERS': False,
     'LOGIN_FIELD': 'email',
@@ -152,3 +208,69 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
+# Reference data (tags, ingredients) response cache
+
+REFERENCE_CACHE_TIMEOUT = int(os.getenv('REFERENCE_CACHE_TIMEOUT', 86400))
+REFERENCE_CACHE_MAX_AGE = int(os.getenv('REFERENCE_CACHE_MAX_AGE', 60))
+
+# Recipe representations without per-user flags (api.serializers)
+
+RECIPE_CACHE_TIMEOUT = int(os.getenv('RECIPE_CACHE_TIMEOUT', 86400))
+
+# Ingredient autocomplete
+
+INGREDIENT_SEARCH_IN_MEMORY = bool(
+    strtobool(os.getenv('INGREDIENT_SEARCH_IN_MEMORY', 'True')))
+
+# Async read endpoints (/api/async/): threads running their ORM queries,
+# each keeping its own persistent connection
+
+ASYNC_DB_WORKERS = int(os.getenv('ASYNC_DB_WORKERS', 10))
+
+# Shopping list export
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf',
+)
+
+# Recipe images
+
+RECIPE_IMAGE_MAX_SIZE = int(
+    os.getenv('RECIPE_IMAGE_MAX_SIZE', 10 * 1024 * 1024))
+RECIPE_IMAGE_THUMB_SIZE = int(os.getenv('RECIPE_IMAGE_THUMB_SIZE', 480))
+RECIPE_IMAGE_WEBP_SIZE = int(os.getenv('RECIPE_IMAGE_WEBP_SIZE', 1280))
+RECIPE_IMAGE_QUALITY = int(os.getenv('RECIPE_IMAGE_QUALITY', 80))
+RECIPE_IMAGE_WORKERS = int(os.getenv('RECIPE_IMAGE_WORKERS', 2))
+RECIPE_IMAGE_UPLOAD_TTL = int(os.getenv('RECIPE_IMAGE_UPLOAD_TTL', 24))
+
+# Uploads larger than FILE_UPLOAD_MAX_MEMORY_SIZE are written to a temporary
+# file; on the MEDIA_ROOT volume it is moved into place without a copy.
+FILE_UPLOAD_TEMP_DIR = os.getenv('FILE_UPLOAD_TEMP_DIR')
+
+# Request performance instrumentation (api.middleware.PerformanceMiddleware)
+
+PERFORMANCE_SAMPLE_RATE = float(os.getenv('PERFORMANCE_SAMPLE_RATE', 0.05))
+PERFORMANCE_SLOW_REQUEST_MS = int(
+    os.getenv('PERFORMANCE_SLOW_REQUEST_MS', 500))
+PERFORMANCE_SLOW_QUERY_MS = int(os.getenv('PERFORMANCE_SLOW_QUERY_MS', 100))
+PERFORMANCE_DUPLICATE_QUERIES = int(
+    os.getenv('PERFORMANCE_DUPLICATE_QUERIES', 5))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+        },
+    },
+    'loggers': {
+        'api.performance': {
+            'handlers': ['console'],
+            'level': os.getenv('PERFORMANCE_LOG_LEVEL', 'WARNING'),
+            'propagate': False,
+        },
+    },
+}
@@ -25,32 +25,43 @@ class IngredientAdmin(admin.ModelAdmin):
         'measurement_unit',
     )
     list_editable = ('name', 'measurement_unit')
-    search_fields = ('name',)
+    list_filter = ('measurement_unit',)
+    # Поиск по началу названия использует индекс UPPER(name).
+    search_fields = ('^name',)
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
 
 class IngredientAmountInline(admin.TabularInline):
+    '''Ингредиенты рецепта, ингредиент выбирается поиском.'''
     model = IngredientAmount
+    autocomplete_fields = ('ingredient',)
+    extra = 1
 
 
 class RecipeAdmin(admin.ModelAdmin):
-    '''Кастомная админка для модели Recipe.'''
+    '''Кастомная админка для модели Recipe.
+
+    Счетчики берутся из полей рецепта, автор выбирается поиском,
+    фильтр только по тегам - их немного.
+    '''
     list_display = (
         'pk',
         'name',
         'author',
         'image',
-        'count_added'
+        'favorites_count',
+        'in_cart_count',
     )
+    list_select_related = ('author',)
     exclude = ('ingredients',)
+    autocomplete_fields = ('author',)
     inlines = (IngredientAmountInline,)
-    list_filter = ('author', 'name', 'tags')
-    search_fields = ('author__username', 'name', 'tags__name')
+    list_filter = ('tags',)
+    search_fields = ('name', '=author__username', '=author__email')
+    show_full_result_count = False
     empty_value_display = '-пусто-'
 
-    def count_added(self, obj):
-        return obj.favorite.count()
-
 
 class FavoriteShoppingAdmin(admin.ModelAdmin):
     '''Кастомная админка для моделей Favorite и ShoppingCart.'''
@@ -59,7 +70,10 @@ class FavoriteShoppingAdmin(admin.ModelAdmin):
         'user',
         'recipe'
     )
-    search_fields = ('user__username', 'recipe__name')
+    list_select_related = ('user', 'recipe')
+    autocomplete_fields = ('user', 'recipe')
+    search_fields = ('=user__username', '=user__email', 'recipe__name')
+    show_full_result_count = False
 
 
 admin.site.register(Tag, TagAdmin)
@@ -0,0 +1,260 @@
+'''Пакетный импорт и экспорт рецептов в формате NDJSON.
+
+Одна строка - один рецепт:
+
+    {"name": "...", "text": "...", "cooking_time": 15,
+     "author": "user@example.com", "tags": ["breakfast"],
+     "ingredients": [{"name": "молоко", "measurement_unit": "мл",
+                      "amount": 200}],
+     "image": "recipes/pancakes.png"}
+
+image - путь существующего файла в MEDIA_ROOT или
+data:image/...;base64,... строка.
+'''
+import base64
+import binascii
+import json
+import logging
+import mimetypes
+import uuid
+from collections import Counter
+
+from django.contrib.auth import get_user_model
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.db.models import Prefetch
+
+from recipes.counters import change_counter
+from recipes.images import schedule_variants
+from recipes.models import (Ingredient, IngredientAmount, Recipe, Tag,
+                            TagsInRecipe)
+
+User = get_user_model()
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+# Сколько сообщений об ошибках хранится (и отдается в ответе API),
+# остальные ошибки только считаются.
+MAX_ERRORS = 100
+
+
+class RecipeImportError(ValueError):
+    pass
+
+
+class RecipeImporter:
+    '''Импорт рецептов пачками через bulk_create.
+
+    Ингредиенты, теги и авторы один раз загружаются в словари,
+    каждая пачка сохраняется в отдельной транзакции. Картинки из
+    base64 пишутся в хранилище при разборе строки и удаляются, если
+    транзакция пачки откатилась.
+    '''
+
+    def __init__(self, batch_size=BATCH_SIZE, default_author=None):
+        self.batch_size = batch_size
+        self.default_author = default_author
+        self.ingredients = {
+            (name, measurement_unit): pk
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'pk', 'name', 'measurement_unit').iterator()
+        }
+        self.tags = dict(Tag.objects.values_list('slug', 'pk'))
+        self.authors = dict(User.objects.values_list('email', 'pk'))
+        self.created = 0
+        self.errors = []
+        self.error_count = 0
+        self.batch = []
+        self.images = []
+
+    def add_error(self, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_ERRORS:
+            self.errors.append(message)
+
+    def load(self, lines):
+        '''Импорт из итерируемого набора строк (str или bytes).'''
+        for number, line in enumerate(lines, start=1):
+            if isinstance(line, bytes):
+                line = line.decode('utf-8')
+            if not line.strip():
+                continue
+            try:
+                self.batch.append(self.parse(json.loads(line)))
+            except (AttributeError, KeyError, TypeError, ValueError) as error:
+                self.add_error(f'Строка {number}: {error}')
+                continue
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        self.flush()
+        return self
+
+    def parse(self, record):
+        '''Проверка записи и сопоставление связей с id.'''
+        email = record.get('author', self.default_author)
+        if email not in self.authors:
+            raise RecipeImportError(f'неизвестный автор {email}')
+        cooking_time = int(record['cooking_time'])
+        if cooking_time < 1:
+            raise RecipeImportError('время приготовления менее минуты')
+        tags = []
+        for slug in record.get('tags', ()):
+            if slug not in self.tags:
+                raise RecipeImportError(f'неизвестный тег {slug}')
+            tags.append(self.tags[slug])
+        amounts = {}
+        for item in record['ingredients']:
+            key = (item['name'], item['measurement_unit'])
+            if key not in self.ingredients:
+                raise RecipeImportError(f'неизвестный ингредиент {key[0]}')
+            amount = int(item['amount'])
+            if amount < 1:
+                raise RecipeImportError('количество менее 1')
+            amounts[self.ingredients[key]] = amount
+        if not amounts:
+            raise RecipeImportError('нет ингредиентов')
+        recipe = Recipe(
+            author_id=self.authors[email],
+            name=record['name'],
+            text=record['text'],
+            cooking_time=cooking_time,
+        )
+        self.set_image(recipe, record.get('image'))
+        return recipe, set(tags), amounts
+
+    def set_image(self, recipe, image):
+        if not image:
+            raise RecipeImportError('нет картинки')
+        if not image.startswith('data:'):
+            # Путь вне MEDIA_ROOT хранилище отвергает исключением.
+            try:
+                exists = default_storage.exists(image)
+            except SuspiciousFileOperation:
+                exists = False
+            if not exists:
+                raise RecipeImportError(f'картинка {image} не найдена')
+            recipe.image.name = image
+            return
+        header, _, data = image.partition(';base64,')
+        extension = mimetypes.guess_extension(header[len('data:'):])
+        try:
+            content = base64.b64decode(data, validate=True)
+        except binascii.Error as error:
+            raise RecipeImportError(f'картинка: {error}')
+        recipe.image.save(
+            f'{uuid.uuid4()}{extension or ""}', ContentFile(content),
+            save=False)
+        self.images.append(recipe.image.name)
+
+    def flush(self):
+        '''Сохранение накопленной пачки в одной транзакции.'''
+        if not self.batch:
+            return
+        batch, self.batch = self.batch, []
+        images, self.images = self.images, []
+        try:
+            self.save(batch)
+        except DatabaseError as error:
+            self.discard(images)
+            self.add_error(f'Пачка из {len(batch)} рецептов: {error}')
+            return
+        except BaseException:
+            self.discard(images)
+            raise
+        self.created += len(batch)
+
+    @staticmethod
+    def discard(images):
+        '''Удаление картинок пачки, которая не сохранилась.'''
+        for name in images:
+            default_storage.delete(name)
+
+    @staticmethod
+    def save(batch):
+        with transaction.atomic():
+            recipes = [recipe for recipe, _, _ in batch]
+            if connection.features.can_return_rows_from_bulk_insert:
+                Recipe.objects.bulk_create(recipes)
+                for recipe in recipes:
+                    schedule_variants(recipe)
+                # bulk_create не отправляет post_save со счетчиками.
+                authors = Counter(recipe.author_id for recipe in recipes)
+                for author, count in authors.items():
+                    change_counter(User, author, 'recipes_count', count)
+            else:
+                for recipe in recipes:
+                    recipe.save()
+            IngredientAmount.objects.bulk_create(
+                IngredientAmount(
+                    recipe=recipe, ingredient_id=ingredient, amount=amount)
+                for recipe, _, amounts in batch
+                for ingredient, amount in amounts.items()
+            )
+            TagsInRecipe.objects.bulk_create(
+                TagsInRecipe(recipe=recipe, tag_id=tag)
+                for recipe, tags, _ in batch
+                for tag in tags
+            )
+
+
+def export_recipes(queryset=None, embed_images=False, chunk_size=BATCH_SIZE):
+    '''Генератор NDJSON строк; рецепты читаются пачками по pk.'''
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    queryset = queryset.select_related(
+        'author'
+    ).prefetch_related(
+        Prefetch('tags', queryset=Tag.objects.only('slug')),
+        Prefetch(
+            'ingredientamount_set',
+            queryset=IngredientAmount.objects.select_related('ingredient'),
+        ),
+    ).order_by('pk')
+    last_pk = 0
+    while True:
+        chunk = list(queryset.filter(pk__gt=last_pk)[:chunk_size])
+        if not chunk:
+            return
+        for recipe in chunk:
+            yield json.dumps(
+                serialize_recipe(recipe, embed_images), ensure_ascii=False
+            ) + '\n'
+        last_pk = chunk[-1].pk
+
+
+def embed_image(recipe):
+    '''data: строка картинки; без файла - None, чтобы не оборвать
+    уже начатую выгрузку.'''
+    try:
+        with recipe.image.open('rb') as file:
+            content = base64.b64encode(file.read()).decode()
+    except (OSError, SuspiciousFileOperation):
+        logger.warning('Картинка %s рецепта %s не найдена',
+                       recipe.image.name, recipe.pk)
+        return None
+    media_type = mimetypes.guess_type(recipe.image.name)[0] or 'image/png'
+    return f'data:{media_type};base64,{content}'
+
+
+def serialize_recipe(recipe, embed_images=False):
+    image = recipe.image.name
+    if embed_images and image:
+        image = embed_image(recipe) or image
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'author': recipe.author.email,
+        'tags': [tag.slug for tag in recipe.tags.all()],
+        'ingredients': [
+            {
+                'name': amount.ingredient.name,
+                'measurement_unit': amount.ingredient.measurement_unit,
+                'amount': amount.amount,
+            }
+            for amount in recipe.ingredientamount_set.all()
+        ],
+        'image': image,
+    }
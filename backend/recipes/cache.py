@@ -0,0 +1,51 @@
+'''Счетчики версий данных в общем кеше.
+
+Версия меняется при изменении данных, а процессы сравнивают ее со
+своей копией, чтобы сбросить локальные кеши без обращения к БД.
+'''
+from django.core.cache import cache
+from django.db import transaction
+
+VERSION_KEY = 'data-version:{}'
+RECIPE_VERSION = 'recipe:{}'
+AUTHOR_VERSION = 'author:{}'
+
+
+def get_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def get_versions(namespaces):
+    '''Версии нескольких пространств за одно обращение к кешу.'''
+    keys = {VERSION_KEY.format(namespace): namespace
+            for namespace in namespaces}
+    found = cache.get_many(keys)
+    return {namespace: found.get(key, 1) for key, namespace in keys.items()}
+
+
+def bump_version(namespace):
+    key = VERSION_KEY.format(namespace)
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
+        return 2
+
+
+def bump_version_on_commit(namespace):
+    '''bump_version после фиксации текущей транзакции.
+
+    До фиксации другие запросы еще читают старые данные и не должны
+    сохранить их в кеш под новой версией.
+    '''
+    transaction.on_commit(lambda: bump_version(namespace))
+
+
+def bump_recipe_versions(recipe_ids):
+    for pk in recipe_ids:
+        bump_version_on_commit(RECIPE_VERSION.format(pk))
@@ -0,0 +1,58 @@
+'''Счетчики популярности рецептов и авторов.
+
+Поля-счетчики меняются атомарно через F() сигналами создания и
+удаления связей (recipes.signals) в той же транзакции; bulk_create
+сигналов не отправляет, такие места меняют счетчики сами.
+Расхождения исправляет команда reconcile_counters.
+'''
+from django.contrib.auth import get_user_model
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Follow
+
+User = get_user_model()
+
+# (модель, поле-счетчик, модель связи, поле связи с моделью)
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_cart_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'followers_count', Follow, 'author'),
+)
+
+
+def change_counter(model, pk, field, delta):
+    '''Атомарное изменение счетчика, значение не опускается ниже нуля.'''
+    if not delta:
+        return 0
+    return model.objects.filter(pk=pk).update(
+        **{field: Greatest(F(field) + delta, Value(0))})
+
+
+def actual_count(related_model, related_field):
+    rows = related_model.objects.filter(
+        **{related_field: OuterRef('pk')}
+    ).order_by().values(related_field).annotate(
+        total=Count('pk')).values('total')
+    return Coalesce(Subquery(rows), 0)
+
+
+def reconcile_counters(check=False):
+    '''Сверка счетчиков с данными.
+
+    Возвращает число расхождений по каждому счетчику; без check
+    расходящиеся значения исправляются.
+    '''
+    drift = {}
+    for model, field, related_model, related_field in COUNTERS:
+        actual = actual_count(related_model, related_field)
+        mismatched = model.objects.annotate(actual=actual).exclude(
+            **{field: F('actual')})
+        if check:
+            drift[f'{model._meta.label}.{field}'] = mismatched.count()
+            continue
+        drift[f'{model._meta.label}.{field}'] = model.objects.filter(
+            pk__in=mismatched.values('pk')).update(**{field: actual})
+    return drift
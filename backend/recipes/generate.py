@@ -0,0 +1,302 @@
+'''Синтетические данные для нагрузочного тестирования.
+
+Авторы, популярные рецепты и подписки выбираются по закону Ципфа:
+немногие авторы пишут большую часть рецептов, немногие рецепты
+собирают большую часть избранного. При одном и том же seed данные
+одинаковы. На PostgreSQL строки пишутся через COPY, на остальных
+базах - bulk_create.
+'''
+import base64
+import csv
+import io
+import random
+import time
+from datetime import timedelta
+from itertools import accumulate, islice
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import connection, transaction
+from django.utils import timezone
+
+from recipes.cache import bump_version
+from recipes.counters import reconcile_counters
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, ShoppingCartTotal, Tag,
+                            TagsInRecipe)
+from users.models import Follow
+
+User = get_user_model()
+
+PASSWORD = 'load-test-password'
+PLACEHOLDER_NAME = 'recipes/placeholder.png'
+# PNG 1x1.
+PLACEHOLDER = base64.b64decode(
+    'iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAfFcSJAAAADUlEQVR42mP8z8Dw'
+    'HwAFBQIAX8jx0gAAAABJRU5ErkJggg=='
+)
+INGREDIENT_WORDS = (
+    'молоко', 'мука', 'масло', 'сахар', 'соль', 'яйца', 'сыр', 'морковь',
+    'картофель', 'лук', 'чеснок', 'мед', 'рис', 'гречка', 'творог',
+)
+MEASUREMENT_UNITS = ('г', 'мл', 'шт.', 'ст. л.', 'ч. л.', 'по вкусу')
+TAGS = (
+    ('Завтрак', 'breakfast', '#E26C2D'),
+    ('Обед', 'lunch', '#49B64E'),
+    ('Ужин', 'dinner', '#8775D2'),
+)
+RECIPE_WORDS = (
+    'Суп', 'Салат', 'Пирог', 'Каша', 'Рагу', 'Запеканка', 'Омлет',
+    'Блины', 'Котлеты', 'Плов', 'Паста', 'Оладьи',
+)
+BATCH_SIZE = 10000
+# Рецепты публикуются равномерно за последний год.
+PUBLISHED_WITHIN = timedelta(days=365)
+
+
+class ZipfSampler:
+    '''Выборка с весами 1 / rank ** skew.
+
+    Ранги назначаются случайной перестановке, чтобы популярными
+    оказывались не только первые по id объекты.
+    '''
+
+    def __init__(self, population, skew, rng):
+        self.rng = rng
+        self.population = list(population)
+        rng.shuffle(self.population)
+        self.cum_weights = list(accumulate(
+            1 / rank ** skew for rank in range(1, len(self.population) + 1)))
+
+    def choices(self, count):
+        return self.rng.choices(
+            self.population, cum_weights=self.cum_weights, k=count)
+
+    def unique(self, count, exclude=None):
+        '''До count разных элементов (повторы отбрасываются).'''
+        return set(self.choices(count)) - {exclude}
+
+
+class DataGenerator:
+    '''Генерация пользователей, рецептов и связей между ними.
+
+    Объемы связей задаются средним на пользователя / рецепт,
+    фактическое число у каждого - от 0 до удвоенного среднего.
+    '''
+
+    def __init__(self, users=1000, recipes=10000, ingredients=2000,
+                 ingredients_per_recipe=6, favorites_per_user=10,
+                 carts_per_user=2, follows_per_user=5, skew=1.1, seed=1,
+                 batch_size=BATCH_SIZE, log=None):
+        self.users = users
+        self.recipes = recipes
+        self.ingredients = ingredients
+        self.ingredients_per_recipe = ingredients_per_recipe
+        self.favorites_per_user = favorites_per_user
+        self.carts_per_user = carts_per_user
+        self.follows_per_user = follows_per_user
+        self.skew = skew
+        self.rng = random.Random(seed)
+        self.batch_size = batch_size
+        self.log = log or (lambda message: None)
+        self.use_copy = connection.vendor == 'postgresql'
+        self.stats = {}
+
+    def run(self):
+        started = time.perf_counter()
+        user_ids = self.stage('пользователи', self.create_users)
+        tag_ids = self.stage('теги', self.create_tags)
+        ingredient_ids = self.stage('ингредиенты', self.create_ingredients)
+        recipe_ids = self.stage('рецепты', self.create_recipes, user_ids)
+        self.stage('ингредиенты рецептов', self.create_amounts,
+                   recipe_ids, ingredient_ids)
+        self.stage('теги рецептов', self.create_recipe_tags,
+                   recipe_ids, tag_ids)
+        self.stage('избранное', self.create_user_relations,
+                   Favorite, user_ids, recipe_ids, self.favorites_per_user)
+        self.stage('корзины', self.create_user_relations,
+                   ShoppingCart, user_ids, recipe_ids, self.carts_per_user)
+        self.stage('подписки', self.create_follows, user_ids)
+        self.stage('суммы корзин', ShoppingCartTotal.objects.refresh)
+        self.stage('счетчики', reconcile_counters)
+        bump_version('ingredients')
+        bump_version('tags')
+        if self.use_copy:
+            with connection.cursor() as cursor:
+                cursor.execute('ANALYZE')
+        self.log(f'Готово за {time.perf_counter() - started:.1f} с.')
+        return self.stats
+
+    def stage(self, name, method, *args):
+        started = time.perf_counter()
+        result = method(*args)
+        elapsed = time.perf_counter() - started
+        if isinstance(result, int):
+            self.stats[name] = result
+        elif isinstance(result, list):
+            self.stats[name] = len(result)
+        self.log(f'{name}: {self.stats.get(name, "-")} за {elapsed:.1f} с.')
+        return result
+
+    def insert(self, model, columns, rows):
+        '''Пакетная запись кортежей значений columns.
+
+        Остальные поля получают значения по умолчанию. Возвращает
+        число записанных строк.
+        '''
+        count = 0
+        rows = iter(rows)
+        while True:
+            batch = list(islice(rows, self.batch_size))
+            if not batch:
+                return count
+            with transaction.atomic():
+                if self.use_copy:
+                    self.copy(model, columns, batch)
+                else:
+                    model.objects.bulk_create(
+                        model(**dict(zip(columns, row))) for row in batch)
+            count += len(batch)
+
+    @staticmethod
+    def copy(model, columns, batch):
+        '''COPY ... FROM STDIN вместо INSERT.
+
+        Модели не создаются: значения пишутся в CSV как есть,
+        недостающие поля заполняются значениями по умолчанию,
+        подготовленными один раз на пачку.
+        '''
+        template = model()
+        fields = [
+            field for field in model._meta.concrete_fields
+            if not field.primary_key
+        ]
+        positions = {name: index for index, name in enumerate(columns)}
+        defaults = [
+            field.get_db_prep_save(field.pre_save(template, True), connection)
+            for field in fields
+        ]
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in batch:
+            writer.writerow([
+                row[positions[field.attname]]
+                if field.attname in positions
+                else r'\N' if default is None else default
+                for field, default in zip(fields, defaults)
+            ])
+        buffer.seek(0)
+        names = ', '.join(
+            connection.ops.quote_name(field.column) for field in fields)
+        table = connection.ops.quote_name(model._meta.db_table)
+        with connection.cursor() as cursor:
+            cursor.cursor.copy_expert(
+                f"COPY {table} ({names}) FROM STDIN "
+                f"WITH (FORMAT csv, NULL '\\N')", buffer)
+
+    def insert_returning_ids(self, model, columns, rows):
+        '''Запись и id новых строк (id растут в порядке вставки).'''
+        last = model.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0
+        self.insert(model, columns, rows)
+        return list(model.objects.filter(pk__gt=last).order_by(
+            'pk').values_list('pk', flat=True))
+
+    def create_users(self):
+        password = make_password(PASSWORD)
+        start = (User.objects.order_by('-pk').values_list(
+            'pk', flat=True).first() or 0) + 1
+        return self.insert_returning_ids(
+            User,
+            ('email', 'username', 'first_name', 'last_name', 'password'),
+            ((f'load{number}@example.com', f'load{number}', 'Имя',
+              'Фамилия', password)
+             for number in range(start, start + self.users)),
+        )
+
+    def create_tags(self):
+        known = set(Tag.objects.values_list('slug', flat=True))
+        Tag.objects.bulk_create(
+            Tag(name=name, slug=slug, color=color)
+            for name, slug, color in TAGS if slug not in known
+        )
+        return list(Tag.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_ingredients(self):
+        '''Недостающие до заданного числа ингредиенты.'''
+        missing = self.ingredients - Ingredient.objects.count()
+        if missing > 0:
+            Ingredient.objects.bulk_create(
+                (Ingredient(
+                    name=(f'{INGREDIENT_WORDS[number % len(INGREDIENT_WORDS)]}'
+                          f' {number // len(INGREDIENT_WORDS)}'),
+                    measurement_unit=self.rng.choice(MEASUREMENT_UNITS),
+                ) for number in range(missing)),
+                batch_size=self.batch_size, ignore_conflicts=True,
+            )
+        return list(
+            Ingredient.objects.order_by('pk').values_list('pk', flat=True))
+
+    def create_recipes(self, user_ids):
+        if not default_storage.exists(PLACEHOLDER_NAME):
+            default_storage.save(PLACEHOLDER_NAME, ContentFile(PLACEHOLDER))
+        authors = ZipfSampler(user_ids, self.skew, self.rng)
+        now = timezone.now()
+        seconds = int(PUBLISHED_WITHIN.total_seconds())
+        return self.insert_returning_ids(
+            Recipe,
+            ('author_id', 'name', 'text', 'cooking_time', 'image',
+             'created_at'),
+            ((author, f'{self.rng.choice(RECIPE_WORDS)} {number}',
+              'Описание рецепта для нагрузочного тестирования.',
+              self.rng.randint(1, 180), PLACEHOLDER_NAME,
+              now - timedelta(seconds=self.rng.randint(0, seconds)))
+             for number, author in enumerate(
+                 authors.choices(self.recipes))),
+        )
+
+    def create_amounts(self, recipe_ids, ingredient_ids):
+        ingredients = ZipfSampler(ingredient_ids, self.skew, self.rng)
+        limit = 2 * self.ingredients_per_recipe
+        return self.insert(
+            IngredientAmount, ('recipe_id', 'ingredient_id', 'amount'),
+            ((recipe, ingredient, self.rng.randint(1, 500))
+             for recipe in recipe_ids
+             for ingredient in ingredients.unique(
+                 self.rng.randint(1, limit))),
+        )
+
+    def create_recipe_tags(self, recipe_ids, tag_ids):
+        return self.insert(
+            TagsInRecipe, ('recipe_id', 'tag_id'),
+            ((recipe, tag)
+             for recipe in recipe_ids
+             for tag in self.rng.sample(
+                 tag_ids, self.rng.randint(1, min(2, len(tag_ids))))),
+        )
+
+    def create_user_relations(self, model, user_ids, recipe_ids, average):
+        recipes = ZipfSampler(recipe_ids, self.skew, self.rng)
+        return self.insert(
+            model, ('user_id', 'recipe_id'),
+            ((user, recipe)
+             for user in user_ids
+             for recipe in recipes.unique(
+                 self.rng.randint(0, 2 * average))),
+        )
+
+    def create_follows(self, user_ids):
+        authors = ZipfSampler(
+            Recipe.objects.order_by('author').values_list(
+                'author', flat=True).distinct(),
+            self.skew, self.rng)
+        limit = 2 * self.follows_per_user
+        return self.insert(
+            Follow, ('user_id', 'author_id'),
+            ((user, author)
+             for user in user_ids
+             for author in authors.unique(
+                 self.rng.randint(0, limit), exclude=user)),
+        )
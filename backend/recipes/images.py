@@ -0,0 +1,130 @@
+'''Варианты картинок рецептов: миниатюра и WebP.
+
+Варианты строятся в фоновом пуле потоков после фиксации транзакции,
+запрос на сохранение рецепта их не ждет. Пока варианта нет,
+выдается исходная картинка.
+'''
+import io
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import close_old_connections, transaction
+from PIL import Image, ImageOps, features
+
+from recipes.cache import bump_recipe_versions
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants'
+WEBP_SUPPORTED = features.check('webp')
+# Имя варианта: (поле модели, наибольшая сторона в пикселях, формат).
+# Фактическая ширина варианта (меньше заданной для узких и маленьких
+# картинок) сохраняется в поле <поле модели>_width.
+# Без поддержки WebP в Pillow миниатюра строится в JPEG,
+# а полноразмерный WebP не строится.
+VARIANTS = {
+    'thumb': ('image_thumb', settings.RECIPE_IMAGE_THUMB_SIZE,
+              'WEBP' if WEBP_SUPPORTED else 'JPEG'),
+}
+if WEBP_SUPPORTED:
+    VARIANTS['webp'] = (
+        'image_webp', settings.RECIPE_IMAGE_WEBP_SIZE, 'WEBP')
+EXTENSIONS = {'WEBP': 'webp', 'JPEG': 'jpg'}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def variant_name(image_name, variant):
+    '''Имя файла варианта однозначно выводится из имени исходника.'''
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    extension = EXTENSIONS[VARIANTS[variant][2]]
+    return f'{VARIANTS_DIR}/{stem}_{variant}.{extension}'
+
+
+def needs_variants(recipe):
+    return bool(recipe.image) and any(
+        getattr(recipe, field).name != variant_name(recipe.image.name, name)
+        or getattr(recipe, f'{field}_width') is None
+        for name, (field, _, _) in VARIANTS.items()
+    )
+
+
+def render_variant(image, size, image_format):
+    '''Содержимое файла варианта и его ширина в пикселях.'''
+    variant = image.copy()
+    variant.thumbnail((size, size), Image.LANCZOS)
+    if image_format == 'JPEG':
+        variant = variant.convert('RGB')
+    buffer = io.BytesIO()
+    variant.save(buffer, image_format,
+                 quality=settings.RECIPE_IMAGE_QUALITY)
+    return buffer.getvalue(), variant.width
+
+
+def build_variants(recipe_id, image_name):
+    '''Построение вариантов для картинки рецепта.
+
+    Поля обновляются только если картинка рецепта не сменилась,
+    пока строились варианты.
+    '''
+    from recipes.models import Recipe
+
+    with default_storage.open(image_name, 'rb') as file:
+        image = Image.open(file)
+        image = ImageOps.exif_transpose(image)
+        image = image.convert('RGBA' if 'A' in image.getbands() else 'RGB')
+    fields = {}
+    for name, (field, size, image_format) in VARIANTS.items():
+        path = variant_name(image_name, name)
+        if default_storage.exists(path):
+            default_storage.delete(path)
+        content, fields[f'{field}_width'] = render_variant(
+            image, size, image_format)
+        fields[field] = default_storage.save(path, ContentFile(content))
+    updated = Recipe.objects.filter(
+        pk=recipe_id, image=image_name).update(**fields)
+    if updated:
+        bump_recipe_versions([recipe_id])
+    return updated
+
+
+def _run(recipe_id, image_name):
+    close_old_connections()
+    try:
+        build_variants(recipe_id, image_name)
+    except Exception:
+        logger.exception('Не удалось построить варианты картинки %s',
+                         image_name)
+    finally:
+        close_old_connections()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.RECIPE_IMAGE_WORKERS,
+                thread_name_prefix='recipe-images',
+            )
+    return _executor
+
+
+def schedule_variants(recipe):
+    '''Построение вариантов после фиксации текущей транзакции.
+
+    При RECIPE_IMAGE_WORKERS = 0 варианты строятся сразу в том же
+    потоке (удобно для команд и отладки).
+    '''
+    recipe_id, image_name = recipe.pk, recipe.image.name
+    if settings.RECIPE_IMAGE_WORKERS:
+        transaction.on_commit(
+            lambda: get_executor().submit(_run, recipe_id, image_name))
+    else:
+        transaction.on_commit(lambda: _run(recipe_id, image_name))
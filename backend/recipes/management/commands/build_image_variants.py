@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import build_variants, needs_variants
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Построение миниатюр и WebP вариантов картинок рецептов.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Перестроить варианты и для рецептов, где они уже есть.',
+        )
+
+    def handle(self, **options):
+        built = failed = 0
+        recipes = Recipe.objects.exclude(image='').only(
+            'pk', 'image', 'image_thumb', 'image_webp', 'image_thumb_width',
+            'image_webp_width').order_by('pk')
+        for recipe in recipes.iterator():
+            if not options['force'] and not needs_variants(recipe):
+                continue
+            try:
+                build_variants(recipe.pk, recipe.image.name)
+            except (OSError, ValueError) as error:
+                failed += 1
+                self.stderr.write(f'{recipe.pk}: {error}')
+                continue
+            built += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Построено: {built}, ошибок: {failed}.'))
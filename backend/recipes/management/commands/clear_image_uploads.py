@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from recipes.models import ImageUpload
+
+
+class Command(BaseCommand):
+    help = 'Удаление картинок, загруженных, но не привязанных к рецептам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--hours', type=int, default=settings.RECIPE_IMAGE_UPLOAD_TTL,
+            help='Удалять загрузки старше указанного числа часов.',
+        )
+
+    def handle(self, **options):
+        expired = ImageUpload.objects.filter(
+            created__lt=timezone.now() - timedelta(hours=options['hours']))
+        deleted = 0
+        for upload in expired.iterator():
+            upload.image.delete(save=False)
+            upload.delete()
+            deleted += 1
+        self.stdout.write(self.style.SUCCESS(f'Удалено загрузок: {deleted}.'))
@@ -0,0 +1,25 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.bulk import export_recipes
+
+
+class Command(BaseCommand):
+    help = 'Экспорт рецептов в NDJSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?', default='-',
+            help='Путь к NDJSON файлу, по умолчанию stdout.')
+        parser.add_argument(
+            '--embed-images', action='store_true',
+            help='Встроить картинки в base64 вместо путей в MEDIA_ROOT.')
+
+    def handle(self, **options):
+        lines = export_recipes(embed_images=options['embed_images'])
+        if options['path'] == '-':
+            sys.stdout.writelines(lines)
+            return
+        with open(options['path'], 'w', encoding='utf-8') as file:
+            file.writelines(lines)
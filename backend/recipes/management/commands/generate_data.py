@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand
+
+from recipes.generate import BATCH_SIZE, PASSWORD, DataGenerator
+
+
+class Command(BaseCommand):
+    help = (
+        'Синтетические пользователи, рецепты, избранное, корзины и '
+        'подписки для нагрузочного тестирования.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument(
+            '--ingredients', type=int, default=2000,
+            help='Дополнить справочник ингредиентов до этого числа.')
+        parser.add_argument(
+            '--ingredients-per-recipe', type=int, default=6,
+            help='Среднее число ингредиентов в рецепте.')
+        parser.add_argument(
+            '--favorites-per-user', type=int, default=10,
+            help='Среднее число рецептов в избранном.')
+        parser.add_argument(
+            '--carts-per-user', type=int, default=2,
+            help='Среднее число рецептов в корзине.')
+        parser.add_argument(
+            '--follows-per-user', type=int, default=5,
+            help='Среднее число подписок.')
+        parser.add_argument(
+            '--skew', type=float, default=1.1,
+            help='Показатель распределения Ципфа.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, **options):
+        generator = DataGenerator(
+            users=options['users'],
+            recipes=options['recipes'],
+            ingredients=options['ingredients'],
+            ingredients_per_recipe=options['ingredients_per_recipe'],
+            favorites_per_user=options['favorites_per_user'],
+            carts_per_user=options['carts_per_user'],
+            follows_per_user=options['follows_per_user'],
+            skew=options['skew'],
+            seed=options['seed'],
+            batch_size=options['batch_size'],
+            log=self.stdout.write,
+        )
+        generator.run()
+        self.stdout.write(self.style.SUCCESS(
+            f'Пароль всех созданных пользователей: {PASSWORD}'))
@@ -1,15 +1,90 @@
-from django.core.management.base import BaseCommand
+import csv
+import json
+from pathlib import Path
 
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.cache import bump_version
 from recipes.models import Ingredient
 
+BATCH_SIZE = 1000
+
 
 class Command(BaseCommand):
+    help = 'Загрузка ингредиентов из CSV (name,unit) или JSON.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=settings.BASE_DIR / 'ingredients.csv',
+            help='Путь к файлу, по умолчанию ingredients.csv.')
+        parser.add_argument(
+            '--format', choices=('csv', 'json'),
+            help='Формат файла, по умолчанию по расширению.')
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только посчитать новые ингредиенты, ничего не записывая.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def read_csv(self, file):
+        reader = csv.reader(file)
+        for row in reader:
+            if not row:
+                continue
+            if len(row) < 2:
+                self.stderr.write(
+                    f'Строка {reader.line_num} пропущена: ожидается '
+                    f'name,measurement_unit.')
+                continue
+            yield row[0], row[1]
+
+    def read_json(self, file):
+        for number, item in enumerate(json.load(file), start=1):
+            try:
+                yield item['name'], item['measurement_unit']
+            except (KeyError, TypeError):
+                self.stderr.write(
+                    f'Запись {number} пропущена: ожидаются поля name '
+                    f'и measurement_unit.')
+
     def handle(self, **options):
-        with open("ingredients.csv") as file:
-            for line in file:
-                ingredient = line.split(',')
-                Ingredient.objects.get_or_create(
-                    name=ingredient[0],
-                    measurement_unit=ingredient[1]
-                )
-        self.stdout.write(self.style.SUCCESS('Все данные загружены.'))
+        path = Path(options['path'])
+        file_format = options['format'] or path.suffix.lstrip('.').lower()
+        if file_format not in ('csv', 'json'):
+            raise CommandError(f'Неизвестный формат файла: {path.name}')
+        known = set(
+            Ingredient.objects.values_list('name', 'measurement_unit'))
+        stats = {'rows': 0, 'new': 0, 'skipped': 0}
+        batch = []
+        with open(path, encoding='utf-8', newline='') as file:
+            rows = getattr(self, f'read_{file_format}')(file)
+            for name, measurement_unit in rows:
+                stats['rows'] += 1
+                key = (name.strip(), measurement_unit.strip())
+                if not all(key) or key in known:
+                    stats['skipped'] += 1
+                    continue
+                known.add(key)
+                stats['new'] += 1
+                if options['dry_run']:
+                    continue
+                batch.append(Ingredient(
+                    name=key[0], measurement_unit=key[1]))
+                if len(batch) >= options['batch_size']:
+                    Ingredient.objects.bulk_create(
+                        batch, ignore_conflicts=True)
+                    batch = []
+        if batch:
+            Ingredient.objects.bulk_create(batch, ignore_conflicts=True)
+        message = (
+            f'Строк: {stats["rows"]}, новых: {stats["new"]}, '
+            f'пропущено: {stats["skipped"]}.'
+        )
+        if options['dry_run']:
+            self.stdout.write(f'Пробный запуск. {message}')
+            return
+        if stats['new']:
+            bump_version('ingredients')
+        self.stdout.write(self.style.SUCCESS(
+            f'Все данные загружены. {message}'))
@@ -0,0 +1,32 @@
+import sys
+
+from django.core.management.base import BaseCommand
+
+from recipes.bulk import BATCH_SIZE, RecipeImporter
+
+
+class Command(BaseCommand):
+    help = 'Импорт рецептов из NDJSON файла.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Путь к NDJSON файлу, "-" для stdin.')
+        parser.add_argument(
+            '--author', help='Email автора для записей без поля author.')
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, **options):
+        importer = RecipeImporter(
+            batch_size=options['batch_size'],
+            default_author=options['author'],
+        )
+        if options['path'] == '-':
+            importer.load(sys.stdin)
+        else:
+            with open(options['path'], encoding='utf-8') as file:
+                importer.load(file)
+        for error in importer.errors:
+            self.stderr.write(error)
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {importer.created}, '
+            f'ошибок: {importer.error_count}.'))
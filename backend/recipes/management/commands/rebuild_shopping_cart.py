@@ -0,0 +1,49 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import Sum
+
+from recipes.models import IngredientAmount, ShoppingCartTotal
+
+
+class Command(BaseCommand):
+    help = 'Пересборка и проверка сводной таблицы корзин.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только сравнить таблицу с корзинами, ничего не меняя.',
+        )
+
+    @staticmethod
+    def expected():
+        return {
+            (row['recipe__shopping_cart__user'], row['ingredient']):
+                row['total']
+            for row in IngredientAmount.objects.filter(
+                recipe__shopping_cart__isnull=False
+            ).values(
+                'recipe__shopping_cart__user', 'ingredient'
+            ).annotate(total=Sum('amount')).order_by().iterator()
+        }
+
+    @staticmethod
+    def stored():
+        return {
+            (user, ingredient): amount
+            for user, ingredient, amount in
+            ShoppingCartTotal.objects.values_list(
+                'user', 'ingredient', 'amount').iterator()
+        }
+
+    def handle(self, **options):
+        if not options['check']:
+            ShoppingCartTotal.objects.refresh()
+        expected, stored = self.expected(), self.stored()
+        mismatched = {
+            key for key in expected.keys() | stored.keys()
+            if expected.get(key) != stored.get(key)
+        }
+        if mismatched:
+            raise CommandError(
+                f'Расхождений в сводной таблице корзин: {len(mismatched)}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Сводная таблица корзин актуальна: {len(stored)} строк.'))
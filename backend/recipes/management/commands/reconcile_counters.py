@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.counters import reconcile_counters
+
+
+class Command(BaseCommand):
+    help = 'Сверка и исправление счетчиков избранного, корзин и подписок.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Только найти расхождения, ничего не меняя.',
+        )
+
+    def handle(self, **options):
+        drift = reconcile_counters(check=options['check'])
+        for counter, count in drift.items():
+            if count:
+                self.stdout.write(f'{counter}: {count}')
+        total = sum(drift.values())
+        if options['check'] and total:
+            raise CommandError(f'Расхождений в счетчиках: {total}.')
+        self.stdout.write(self.style.SUCCESS(
+            f'Счетчики актуальны, исправлено: {total}.'))
@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:55
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def fill_shopping_cart_totals(apps, schema_editor):
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    ShoppingCartTotal = apps.get_model('recipes', 'ShoppingCartTotal')
+    ShoppingCartTotal.objects.bulk_create(
+        (ShoppingCartTotal(user_id=row['recipe__shopping_cart__user'],
+                           ingredient_id=row['ingredient'],
+                           amount=row['total'])
+         for row in IngredientAmount.objects.filter(
+             recipe__shopping_cart__isnull=False
+        ).values(
+             'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(total=models.Sum('amount')).order_by().iterator()),
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('recipes', '0002_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ShoppingCartTotal',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('amount', models.PositiveIntegerField(verbose_name='Количество')),
+                ('ingredient', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to='recipes.ingredient', verbose_name='Ингредиент')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='shopping_cart_totals', to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Сумма ингредиентов в корзине',
+                'verbose_name_plural': 'Суммы ингредиентов в корзине',
+                'default_related_name': 'shopping_cart_totals',
+                'unique_together': {('user', 'ingredient')},
+            },
+        ),
+        migrations.RunPython(
+            fill_shopping_cart_totals, migrations.RunPython.noop),
+    ]
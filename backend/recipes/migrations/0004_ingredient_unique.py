@@ -0,0 +1,72 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:57
+
+from django.db import migrations
+
+
+def merge_references(model, owner, replaced):
+    '''Перенос ссылок на ингредиенты-дубликаты с суммированием.'''
+    for row in list(model.objects.filter(ingredient_id__in=replaced)):
+        target = model.objects.filter(
+            **{owner: getattr(row, owner)},
+            ingredient_id=replaced[row.ingredient_id],
+        ).first()
+        if target is None:
+            row.ingredient_id = replaced[row.ingredient_id]
+            row.save(update_fields=('ingredient',))
+            continue
+        target.amount += row.amount
+        target.save(update_fields=('amount',))
+        row.delete()
+
+
+def deduplicate_ingredients(apps, schema_editor):
+    '''Склеивает ингредиенты, одинаковые без учета пробелов по краям.
+
+    Старый import_db оставлял пробелы и переводы строк и мог загрузить
+    одну пару (name, measurement_unit) несколько раз. Остается
+    ингредиент с наименьшим id, рецепты и сводная таблица корзин
+    переходят на него, количества складываются.
+    '''
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    kept, replaced = {}, {}
+    for pk, name, measurement_unit in Ingredient.objects.order_by(
+            'pk').values_list('pk', 'name', 'measurement_unit'):
+        key = (name.strip(), measurement_unit.strip())
+        if key in kept:
+            replaced[pk] = kept[key][0]
+        else:
+            kept[key] = (pk, name, measurement_unit)
+    if replaced:
+        merge_references(
+            apps.get_model('recipes', 'IngredientAmount'), 'recipe_id',
+            replaced)
+        merge_references(
+            apps.get_model('recipes', 'ShoppingCartTotal'), 'user_id',
+            replaced)
+        Ingredient.objects.filter(pk__in=list(replaced)).delete()
+    changed = [
+        Ingredient(pk=pk, name=key[0], measurement_unit=key[1])
+        for key, (pk, name, measurement_unit) in kept.items()
+        if key != (name, measurement_unit)
+    ]
+    Ingredient.objects.bulk_update(
+        changed, ('name', 'measurement_unit'), batch_size=1000)
+    # Отложенные проверки внешних ключей выполняются сейчас, иначе
+    # PostgreSQL не даст изменить таблицу в этой же транзакции.
+    schema_editor.connection.check_constraints()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0003_shoppingcarttotal'),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            deduplicate_ingredients, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='ingredient',
+            unique_together={('name', 'measurement_unit')},
+        ),
+    ]
@@ -0,0 +1,46 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+INDEXES = (
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_prefix '
+    'ON recipes_ingredient (UPPER(name::text) text_pattern_ops)',
+    'CREATE INDEX IF NOT EXISTS recipes_ingredient_name_trgm '
+    'ON recipes_ingredient USING gin (UPPER(name::text) gin_trgm_ops)',
+)
+DROP_INDEXES = (
+    'DROP INDEX IF EXISTS recipes_ingredient_name_prefix',
+    'DROP INDEX IF EXISTS recipes_ingredient_name_trgm',
+)
+
+
+class TrigramExtensionOnPostgreSQL(TrigramExtension):
+    '''Откат тоже только на PostgreSQL: в Django 3.2 database_backwards
+    не проверяет СУБД и падает на SQLite.'''
+
+    def database_backwards(self, app_label, schema_editor, from_state,
+                           to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(
+                app_label, schema_editor, from_state, to_state)
+
+
+def run_on_postgresql(statements):
+    def run(apps, schema_editor):
+        if schema_editor.connection.vendor != 'postgresql':
+            return
+        for statement in statements:
+            schema_editor.execute(statement)
+    return run
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0004_ingredient_unique'),
+    ]
+
+    operations = [
+        TrigramExtensionOnPostgreSQL(),
+        migrations.RunPython(
+            run_on_postgresql(INDEXES), run_on_postgresql(DROP_INDEXES)),
+    ]
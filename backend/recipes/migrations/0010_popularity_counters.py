@@ -0,0 +1,49 @@
+# Generated by Django 3.2.3 on 2026-10-18 03:09
+
+from django.db import migrations, models
+from django.db.models.functions import Coalesce
+
+COUNTERS = (
+    (('recipes', 'Recipe'), 'favorites_count', ('recipes', 'Favorite'),
+     'recipe'),
+    (('recipes', 'Recipe'), 'in_cart_count', ('recipes', 'ShoppingCart'),
+     'recipe'),
+    (('users', 'User'), 'recipes_count', ('recipes', 'Recipe'), 'author'),
+    (('users', 'User'), 'followers_count', ('users', 'Follow'), 'author'),
+)
+
+
+def fill_counters(apps, schema_editor):
+    for model, field, related_model, related_field in COUNTERS:
+        rows = apps.get_model(*related_model).objects.filter(
+            **{related_field: models.OuterRef('pk')}
+        ).order_by().values(related_field).annotate(
+            total=models.Count('pk')).values('total')
+        apps.get_model(*model).objects.update(**{field: Coalesce(
+            models.Subquery(rows), 0)})
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0009_imageupload'),
+        ('users', '0003_popularity_counters'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='favorites_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В избранном'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='in_cart_count',
+            field=models.PositiveIntegerField(default=0, editable=False, verbose_name='В корзинах'),
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['-favorites_count', 'name', 'id'], name='recipe_favorites_idx'),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.3 on 2026-10-18 04:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_recipe_feed'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_thumb_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина миниатюры'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_webp_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки в WebP'),
+        ),
+    ]
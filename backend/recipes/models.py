@@ -1,6 +1,10 @@
+import uuid
+
 from colorfield.fields import ColorField
+from django.apps import apps
 from django.contrib.auth import get_user_model
-from django.db import models
+from django.db import connections, models, transaction
+from django.utils import timezone
 
 User = get_user_model()
 
@@ -57,11 +61,97 @@ class Ingredient(models.Model):
         ordering = ('name',)
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        unique_together = ('name', 'measurement_unit')
 
     def __str__(self):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    '''Запросы для выдачи рецептов без N+1.'''
+
+    def with_user_flags(self, user):
+        '''Аннотация is_favorited / is_in_shopping_cart для пользователя.'''
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=models.Value(
+                    False, output_field=models.BooleanField()),
+                is_in_shopping_cart=models.Value(
+                    False, output_field=models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=models.Exists(Favorite.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+            is_in_shopping_cart=models.Exists(ShoppingCart.objects.filter(
+                user=user, recipe=models.OuterRef('pk'))),
+        )
+
+    @staticmethod
+    def related_prefetches():
+        '''Prefetch тегов и ингредиентов (и для prefetch_related_objects).'''
+        return (
+            models.Prefetch('tags', queryset=Tag.objects.all()),
+            models.Prefetch(
+                'ingredientamount_set',
+                queryset=IngredientAmount.objects.select_related(
+                    'ingredient'),
+            ),
+        )
+
+    def with_related(self):
+        '''Автор, теги и ингредиенты за постоянное число запросов.'''
+        return self.select_related('author').prefetch_related(
+            *self.related_prefetches())
+
+    def for_display(self, user):
+        '''Рецепты для ShowRecipeSerializer.'''
+        return self.with_related().with_user_flags(user)
+
+    def feed(self, user, limit, before=None):
+        '''Ключи (created_at, id) ленты подписок, новые сначала.
+
+        before - ключ последнего рецепта предыдущей страницы. На
+        PostgreSQL это ограниченное k-путевое слияние: для каждой
+        подписки LATERAL подзапрос берет по индексу
+        recipe_author_created_idx не больше limit рецептов, из них
+        выбираются limit самых новых. Работа зависит от числа
+        подписок и limit, но не от числа рецептов у авторов.
+        '''
+        if connections[self.db].vendor == 'postgresql':
+            return self.feed_merged(user, limit, before)
+        recipes = self.filter(author__following__user=user)
+        if before is not None:
+            recipes = recipes.filter(
+                models.Q(created_at__lt=before[0])
+                | models.Q(created_at=before[0], id__lt=before[1]))
+        return list(recipes.order_by('-created_at', '-id').values_list(
+            'created_at', 'id')[:limit])
+
+    def feed_merged(self, user, limit, before):
+        follow_model = apps.get_model('users', 'Follow')
+        connection = connections[self.db]
+        quote = connection.ops.quote_name
+        condition, params = '', []
+        if before is not None:
+            condition = 'AND (r.created_at, r.id) < (%s, %s)'
+            params = list(before)
+        sql = (
+            'SELECT latest.created_at, latest.id '
+            f'FROM {quote(follow_model._meta.db_table)} f '
+            'CROSS JOIN LATERAL ('
+            '    SELECT r.created_at, r.id '
+            f'   FROM {quote(self.model._meta.db_table)} r '
+            f'   WHERE r.author_id = f.author_id {condition} '
+            '    ORDER BY r.created_at DESC, r.id DESC LIMIT %s'
+            ') latest '
+            'WHERE f.user_id = %s '
+            'ORDER BY latest.created_at DESC, latest.id DESC LIMIT %s'
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [*params, limit, user.pk, limit])
+            return [tuple(row) for row in cursor.fetchall()]
+
+
 class Recipe(models.Model):
     '''Модель рецепта.'''
     author = models.ForeignKey(
@@ -77,6 +167,26 @@ class Recipe(models.Model):
     image = models.ImageField(
         verbose_name='Картинка рецепта',
     )
+    image_thumb = models.ImageField(
+        blank=True,
+        editable=False,
+        verbose_name='Миниатюра',
+    )
+    image_webp = models.ImageField(
+        blank=True,
+        editable=False,
+        verbose_name='Картинка в WebP',
+    )
+    image_thumb_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина миниатюры',
+    )
+    image_webp_width = models.PositiveIntegerField(
+        null=True,
+        editable=False,
+        verbose_name='Ширина картинки в WebP',
+    )
     text = models.TextField(
         verbose_name='Описание',
     )
@@ -95,11 +205,37 @@ class Recipe(models.Model):
     cooking_time = models.PositiveSmallIntegerField(
         verbose_name='Время приготовления',
     )
+    created_at = models.DateTimeField(
+        default=timezone.now,
+        editable=False,
+        verbose_name='Дата публикации',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном',
+    )
+    in_cart_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В корзинах',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
-        ordering = ('name',)
+        ordering = ('name', 'id')
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
+        indexes = (
+            models.Index(fields=('name', 'id'), name='recipe_name_id_idx'),
+            models.Index(
+                fields=('-favorites_count', 'name', 'id'),
+                name='recipe_favorites_idx'),
+            models.Index(
+                fields=('author', 'created_at', 'id'),
+                name='recipe_author_created_idx'),
+        )
 
     def __str__(self):
         return self.name
@@ -122,6 +258,10 @@ class TagsInRecipe(models.Model):
         verbose_name = "Теги в рецепте"
         verbose_name_plural = verbose_name
         unique_together = ('tag', 'recipe')
+        indexes = (
+            models.Index(
+                fields=('recipe', 'tag'), name='tagsinrecipe_recipe_tag_idx'),
+        )
 
 
 class IngredientAmount(models.Model):
@@ -144,6 +284,11 @@ class IngredientAmount(models.Model):
         verbose_name = 'Количество ингредиентов в рецепте'
         verbose_name_plural = verbose_name
         unique_together = ('ingredient', 'recipe')
+        indexes = (
+            models.Index(
+                fields=('recipe', 'ingredient'), include=('amount',),
+                name='amount_recipe_ingredient_idx'),
+        )
 
 
 class Favorite(models.Model):
@@ -164,6 +309,10 @@ class Favorite(models.Model):
         verbose_name_plural = verbose_name
         default_related_name = 'favorite'
         unique_together = ('user', 'recipe')
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'), name='favorite_recipe_user_idx'),
+        )
 
 
 class ShoppingCart(models.Model):
@@ -184,3 +333,116 @@ class ShoppingCart(models.Model):
         verbose_name_plural = verbose_name
         default_related_name = 'shopping_cart'
         unique_together = ('user', 'recipe')
+        indexes = (
+            models.Index(
+                fields=('recipe', 'user'), name='cart_recipe_user_idx'),
+        )
+
+
+class ShoppingCartTotalQuerySet(models.QuerySet):
+    '''Поддержка сводной таблицы корзины в актуальном состоянии.'''
+
+    def refresh(self, users=None, ingredients=None):
+        '''Пересчет сумм по затронутым парам (пользователь, ингредиент).
+
+        users и ingredients - объекты, id или queryset; None означает
+        "все". Суммы пересчитываются только по этим ключам. Строки
+        пользователей блокируются до конца транзакции, чтобы
+        одновременные пересчеты одной корзины шли по очереди.
+        '''
+        stale = self.all()
+        # Условия на корзину в одном filter(): при двух вызовах
+        # recipes_shoppingcart присоединяется дважды и суммы
+        # умножаются на число корзин с рецептом.
+        conditions = {'recipe__shopping_cart__isnull': False}
+        locked = User.objects.all()
+        if users is not None:
+            if not isinstance(users, models.QuerySet):
+                users = [getattr(user, 'pk', user) for user in users]
+            stale = stale.filter(user__in=users)
+            conditions['recipe__shopping_cart__user__in'] = users
+            locked = locked.filter(pk__in=users)
+        if ingredients is not None:
+            stale = stale.filter(ingredient__in=ingredients)
+            conditions['ingredient__in'] = ingredients
+        totals = IngredientAmount.objects.filter(**conditions).values(
+            'recipe__shopping_cart__user', 'ingredient'
+        ).annotate(total=models.Sum('amount')).order_by()
+        with transaction.atomic():
+            list(locked.select_for_update().order_by('pk').values_list(
+                'pk', flat=True))
+            stale.delete()
+            self.bulk_create(
+                (self.model(user_id=row['recipe__shopping_cart__user'],
+                            ingredient_id=row['ingredient'],
+                            amount=row['total'])
+                 for row in totals.iterator()),
+                batch_size=1000,
+            )
+
+
+class ShoppingCartTotal(models.Model):
+    '''Суммы ингредиентов в корзине пользователя.
+
+    Денормализация ShoppingCart x IngredientAmount для скачивания
+    списка покупок. Обновляется сигналами корзины и ингредиентов
+    рецепта (recipes.totals), пересобирается командой
+    rebuild_shopping_cart.
+    '''
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    objects = ShoppingCartTotalQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Сумма ингредиентов в корзине'
+        verbose_name_plural = 'Суммы ингредиентов в корзине'
+        default_related_name = 'shopping_cart_totals'
+        unique_together = ('user', 'ingredient')
+
+
+class ImageUpload(models.Model):
+    '''Картинка, загруженная до создания рецепта.
+
+    Рецепт ссылается на нее по token вместо base64 строки,
+    неиспользованные загрузки удаляет команда clear_image_uploads.
+    '''
+    token = models.UUIDField(
+        default=uuid.uuid4,
+        unique=True,
+        editable=False,
+        verbose_name='Токен',
+    )
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='image_uploads',
+        verbose_name='Пользователь',
+    )
+    image = models.ImageField(
+        upload_to='recipes/uploads/',
+        verbose_name='Картинка',
+    )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Загружена',
+    )
+
+    class Meta:
+        verbose_name = 'Загрузка картинки'
+        verbose_name_plural = 'Загрузки картинок'
+
+    def __str__(self):
+        return str(self.token)
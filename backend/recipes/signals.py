@@ -0,0 +1,105 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from recipes.cache import (AUTHOR_VERSION, bump_recipe_versions,
+                           bump_version_on_commit)
+from recipes.counters import COUNTERS, change_counter
+from recipes.images import needs_variants, schedule_variants
+from recipes.models import (Favorite, Ingredient, IngredientAmount, Recipe,
+                            ShoppingCart, Tag, TagsInRecipe)
+from recipes.totals import refresh_totals_on_commit
+from users.models import Follow
+
+User = get_user_model()
+
+# Поля пользователя в представлении рецепта (CustomUserSerializer).
+AUTHOR_FIELDS = {'email', 'username', 'first_name', 'last_name'}
+# Модель связи: (модель со счетчиком, поле-счетчик, поле связи).
+COUNTED = {
+    related_model: (model, field, related_field)
+    for model, field, related_model, related_field in COUNTERS
+}
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version_on_commit('ingredients')
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def tag_changed(**kwargs):
+    bump_version_on_commit('tags')
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, **kwargs):
+    if needs_variants(instance):
+        schedule_variants(instance)
+
+
+@receiver((post_save, post_delete), sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    bump_recipe_versions([instance.pk])
+
+
+def count(sender, instance, delta):
+    model, field, related_field = COUNTED[sender]
+    change_counter(
+        model, getattr(instance, f'{related_field}_id'), field, delta)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Follow)
+def counted_created(sender, instance, created, raw=False, **kwargs):
+    '''Счетчики в транзакции записи при любом способе создания.'''
+    if created and not raw:
+        count(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Follow)
+def counted_deleted(sender, instance, **kwargs):
+    '''В том числе каскадное удаление вместе с пользователем.'''
+    count(sender, instance, -1)
+
+
+@receiver((post_save, post_delete), sender=IngredientAmount)
+@receiver((post_save, post_delete), sender=TagsInRecipe)
+def recipe_part_changed(instance, **kwargs):
+    bump_recipe_versions([instance.recipe_id])
+
+
+@receiver((post_save, post_delete), sender=ShoppingCart)
+def cart_changed(instance, **kwargs):
+    '''Корзина пересчитывается целиком: при удалении рецепта его
+    ингредиенты к фиксации уже удалены.'''
+    refresh_totals_on_commit(users=[instance.user_id])
+
+
+@receiver((post_save, post_delete), sender=IngredientAmount)
+def cart_ingredient_changed(instance, **kwargs):
+    refresh_totals_on_commit(
+        recipe=instance.recipe_id, ingredients=[instance.ingredient_id])
+
+
+@receiver(m2m_changed, sender=TagsInRecipe)
+def recipe_tags_changed(instance, action, reverse, pk_set, **kwargs):
+    '''recipe.tags.set() / add() / remove() / clear() без post_save.'''
+    if not reverse:
+        if action.startswith('post_'):
+            bump_recipe_versions([instance.pk])
+    elif action == 'pre_clear':
+        bump_recipe_versions(instance.recipes.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        bump_recipe_versions(pk_set)
+
+
+@receiver((post_save, post_delete), sender=User)
+def author_changed(instance, update_fields=None, **kwargs):
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        bump_version_on_commit(AUTHOR_VERSION.format(instance.pk))
@@ -0,0 +1,49 @@
+'''Пересчет сводной таблицы корзин после фиксации транзакции.
+
+Сигналы ShoppingCart и IngredientAmount копят затронутые ключи, а
+пересчет идет один раз на транзакцию: удаление рецепта из тысячи
+корзин не превращается в тысячу пересчетов. Пересчет из данных
+идемпотентен, поэтому ключи откаченной транзакции просто уходят в
+следующий пересчет.
+'''
+import threading
+from collections import defaultdict
+
+from django.contrib.auth import get_user_model
+from django.db import transaction
+
+from recipes.models import ShoppingCartTotal
+
+User = get_user_model()
+
+_pending = threading.local()
+
+
+def pending():
+    if not hasattr(_pending, 'users'):
+        _pending.users = set()
+        _pending.recipes = defaultdict(set)
+    return _pending
+
+
+def refresh_totals_on_commit(users=(), recipe=None, ingredients=()):
+    '''Пересчет после фиксации: корзины users целиком и ингредиенты
+    ingredients во всех корзинах с рецептом recipe.'''
+    state = pending()
+    state.users.update(users)
+    if recipe is not None:
+        state.recipes[recipe].update(ingredients)
+    transaction.on_commit(flush)
+
+
+def flush():
+    state = pending()
+    users, recipes = state.users, state.recipes
+    if not (users or recipes):
+        return
+    del _pending.users, _pending.recipes
+    if users:
+        ShoppingCartTotal.objects.refresh(users)
+    for recipe, ingredients in recipes.items():
+        ShoppingCartTotal.objects.refresh(
+            User.objects.filter(shopping_cart__recipe=recipe), ingredients)
@@ -7,15 +7,21 @@ from users.models import Follow, User
 
 class CustomUserAdmin(UserAdmin):
     '''Настройки админки для модели User.'''
+    list_display = ('username', 'email', 'first_name', 'last_name',
+                    'recipes_count', 'followers_count', 'is_staff')
     search_fields = ('email', 'username')
-    list_filter = ('email', 'username')
+    list_filter = ('is_staff', 'is_active')
     ordering = ('username',)
+    show_full_result_count = False
 
 
 class SubscriptionAdmin(admin.ModelAdmin):
     '''Настройки админки для модели Subscription.'''
     list_display = ('user', 'author')
-    search_fields = ('user__username', 'author__username')
+    list_select_related = ('user', 'author')
+    autocomplete_fields = ('user', 'author')
+    search_fields = ('=user__username', '=author__username')
+    show_full_result_count = False
 
 
 admin.site.register(User, CustomUserAdmin)
@@ -1,6 +1,9 @@
+from django.apps import apps
 from django.contrib.auth.models import AbstractUser
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.db import models
+from django.db.models.expressions import RawSQL, Window
+from django.db.models.functions import RowNumber
 
 from users.validators import validate_username_me
 
@@ -30,6 +33,16 @@ class User(AbstractUser):
     last_name = models.CharField(
         max_length=MAX_LENGTH,
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов',
+    )
+    followers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков',
+    )
 
     class Meta:
         verbose_name = 'Пользователь'
@@ -40,6 +53,58 @@ class User(AbstractUser):
         return self.username
 
 
+class FollowQuerySet(models.QuerySet):
+    '''Запросы для ленты подписок.'''
+
+    def subscriptions_of(self, user):
+        '''Подписки пользователя с авторами; рецепты авторов страницы
+        добавляет prefetch_feed_recipes.'''
+        return self.filter(user=user).select_related('author').order_by('id')
+
+
+def feed_recipes(authors, recipes_limit=None):
+    '''Рецепты для подписок, при recipes_limit - первые recipes_limit
+    рецептов каждого автора.
+
+    Строки нумеруются ROW_NUMBER() по автору только для authors -
+    авторов текущей страницы, а не всех подписок пользователя.
+    '''
+    recipe_model = apps.get_model('recipes', 'Recipe')
+    recipes = recipe_model.objects.all()
+    if recipes_limit is None:
+        return recipes
+    ranked = recipe_model.objects.filter(
+        author__in=authors
+    ).annotate(
+        row_number=Window(
+            expression=RowNumber(),
+            partition_by=models.F('author'),
+            order_by=[models.F(field).asc() for field in
+                      recipe_model._meta.ordering],
+        )
+    ).values('pk', 'row_number')
+    sql, params = ranked.query.sql_with_params()
+    return recipes.filter(pk__in=RawSQL(
+        f'SELECT ranked.id FROM ({sql}) ranked '
+        'WHERE ranked.row_number <= %s',
+        (*params, recipes_limit),
+    ))
+
+
+def prefetch_feed_recipes(follows, recipes_limit=None):
+    '''Рецепты авторов страницы подписок одним запросом в
+    author.feed_recipes.'''
+    follows = list(follows)
+    if follows:
+        authors = {follow.author_id for follow in follows}
+        models.prefetch_related_objects(follows, models.Prefetch(
+            'author__recipes',
+            queryset=feed_recipes(authors, recipes_limit),
+            to_attr='feed_recipes',
+        ))
+    return follows
+
+
 class Follow(models.Model):
     '''Модель подписки на автора.'''
     user = models.ForeignKey(
@@ -55,7 +120,13 @@ class Follow(models.Model):
         verbose_name='Автор',
     )
 
+    objects = FollowQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Подписка'
         verbose_name_plural = 'Подписки'
         unique_together = ('user', 'author')
+        indexes = (
+            models.Index(
+                fields=('author', 'user'), name='follow_author_user_idx'),
+        )
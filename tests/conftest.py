@@ -0,0 +1,110 @@
+import io
+from itertools import count
+
+import pytest
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.search import ingredient_index
+from recipes.models import Ingredient, IngredientAmount, Recipe, Tag
+from users.models import User
+
+_numbers = count(1)
+
+
+def png(size=(8, 8)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'orange').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+@pytest.fixture(autouse=True)
+def clean_cache():
+    '''Общий кеш и индекс ингредиентов не переживают тест.'''
+    cache.clear()
+    ingredient_index.version = None
+    yield
+    cache.clear()
+    ingredient_index.version = None
+
+
+@pytest.fixture(autouse=True)
+def media_root(settings, tmp_path):
+    settings.MEDIA_ROOT = str(tmp_path)
+    return tmp_path
+
+
+@pytest.fixture
+def make_user(db):
+    def make_user(**fields):
+        number = next(_numbers)
+        fields = {
+            'email': f'user{number}@example.com',
+            'username': f'user{number}',
+            'first_name': 'Имя',
+            'last_name': 'Фамилия',
+            **fields,
+        }
+        return User.objects.create_user(password='password123', **fields)
+    return make_user
+
+
+@pytest.fixture
+def user(make_user):
+    return make_user()
+
+
+@pytest.fixture
+def client_for():
+    '''APIClient с токеном пользователя (None - анонимный).'''
+    def client_for(user=None):
+        client = APIClient()
+        if user is not None:
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+    return client_for
+
+
+@pytest.fixture
+def make_tag(db):
+    def make_tag(slug=None):
+        number = next(_numbers)
+        slug = slug or f'tag{number}'
+        return Tag.objects.create(
+            name=slug, slug=slug, color=f'#{number:06X}')
+    return make_tag
+
+
+@pytest.fixture
+def make_ingredient(db):
+    def make_ingredient(name=None, measurement_unit='г'):
+        return Ingredient.objects.create(
+            name=name or f'ингредиент {next(_numbers)}',
+            measurement_unit=measurement_unit)
+    return make_ingredient
+
+
+@pytest.fixture
+def make_recipe(db):
+    '''Рецепт автора с ингредиентами {ingredient: amount} и тегами.'''
+    def make_recipe(author, ingredients=None, tags=(), **fields):
+        number = next(_numbers)
+        recipe = Recipe.objects.create(
+            author=author,
+            name=fields.pop('name', f'рецепт {number}'),
+            text='Описание',
+            cooking_time=10,
+            image=SimpleUploadedFile(f'recipe{number}.png', png()),
+            **fields,
+        )
+        IngredientAmount.objects.bulk_create(
+            IngredientAmount(recipe=recipe, ingredient=ingredient,
+                             amount=amount)
+            for ingredient, amount in (ingredients or {}).items())
+        recipe.tags.set(tags)
+        return recipe
+    return make_recipe
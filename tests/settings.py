@@ -0,0 +1,37 @@
+'''Настройки тестов.
+
+По умолчанию база - SQLite в памяти. С DB_ENGINE=postgresql и
+переменными подключения из conf.settings тесты идут на PostgreSQL,
+тогда выполняются и тесты планов запросов.
+'''
+import os
+import tempfile
+
+os.environ.setdefault('SECRET_KEY', 'tests')
+
+from conf.settings import *  # noqa: E402,F401,F403
+from conf.settings import DATABASES  # noqa: E402
+
+if 'postgresql' not in os.getenv('DB_ENGINE', 'sqlite3'):
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': ':memory:',
+        },
+    }
+DATABASES = {'default': {**DATABASES['default'], 'CONN_MAX_AGE': 0}}
+# Реплика для тестов роутера: то же соединение с тестовой базой, но
+# отдельный алиас. Остальные тесты читают из default.
+DATABASES['replica'] = {
+    **DATABASES['default'], 'TEST': {'MIRROR': 'default'}}
+REPLICA_DATABASES = []
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+}
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+MEDIA_ROOT = tempfile.mkdtemp(prefix='foodgram-tests-')
+RECIPE_IMAGE_WORKERS = 0
+PERFORMANCE_SAMPLE_RATE = 0.0
@@ -0,0 +1,70 @@
+from collections import defaultdict
+
+import pytest
+from django.core.management import call_command
+from django.urls import Resolver404, URLResolver, resolve, reverse
+
+from api import urls
+from api.benchmark import NOT_BENCHMARKED, ROUTES, run, seed
+
+pytestmark = pytest.mark.django_db
+
+USERS, RECIPES = 50, 600
+# Второй проход идет по прогретому кешу и повторяет пары
+# добавить / удалить на том же состоянии.
+REPEAT = 2
+
+
+@pytest.fixture(scope='module')
+def results(django_db_setup, django_db_blocker):
+    '''Один прогон всех маршрутов на весь модуль.
+
+    Маршруты зависят друг от друга (созданный рецепт затем меняется и
+    удаляется), поэтому идут подряд вне транзакции теста; данные
+    удаляются после модуля.
+    '''
+    with django_db_blocker.unblock():
+        results = run(seed(USERS, RECIPES, seed=1), REPEAT)
+        yield {result['route']: result for result in results}
+        call_command('flush', interactive=False, verbosity=0)
+
+
+def api_url_names(patterns=urls.urlpatterns):
+    '''Имена маршрутов api/urls.py, до которых доходит запрос: копии
+    djoser.urls за роутером CustomUserViewSet недостижимы.'''
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from api_url_names(pattern.url_patterns)
+            continue
+        kwargs = {name: 1 for name in pattern.pattern.regex.groupindex
+                  if name != 'format'}
+        if len(kwargs) < len(pattern.pattern.regex.groupindex):
+            continue
+        path = reverse(f'api:{pattern.name}', kwargs=kwargs)
+        if resolve(path).url_name == pattern.name:
+            yield pattern.name
+
+
+def route_url_name(route):
+    url = route.url.format_map(defaultdict(lambda: 1))
+    try:
+        return resolve(url.split('?')[0]).url_name
+    except Resolver404:
+        # Ссылка из предыдущего ответа (например, {feed_next}).
+        return None
+
+
+def test_routes_are_unique():
+    assert len({route.label for route in ROUTES}) == len(ROUTES)
+
+
+def test_every_api_route_is_benchmarked():
+    benchmarked = {route_url_name(route) for route in ROUTES} - {None}
+    assert benchmarked == set(api_url_names()) - NOT_BENCHMARKED
+
+
+@pytest.mark.parametrize(
+    'label', [route.label for route in ROUTES])
+def test_route_within_budget(results, label):
+    result = results[label]
+    assert not result['errors'], result
@@ -0,0 +1,80 @@
+import base64
+import json
+from unittest import mock
+
+import pytest
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import DatabaseError
+
+from recipes import bulk
+from recipes.bulk import RecipeImporter, export_recipes
+from recipes.models import Recipe
+
+from conftest import png
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def record(user, make_ingredient):
+    ingredient = make_ingredient()
+    return {
+        'name': 'Блины',
+        'text': 'Описание',
+        'cooking_time': 15,
+        'author': user.email,
+        'ingredients': [{'name': ingredient.name,
+                         'measurement_unit': ingredient.measurement_unit,
+                         'amount': 200}],
+        'image': 'data:image/png;base64,'
+                 + base64.b64encode(png()).decode(),
+    }
+
+
+def test_import_keeps_images_of_saved_batch(record):
+    importer = RecipeImporter().load([json.dumps(record)])
+    assert importer.created == 1
+    assert default_storage.exists(Recipe.objects.get().image.name)
+
+
+def test_failed_batch_removes_its_images(record):
+    importer = RecipeImporter()
+    with mock.patch.object(
+            RecipeImporter, 'save', side_effect=DatabaseError('сбой')):
+        importer.load([json.dumps(record)] * 2)
+    assert importer.created == 0
+    assert importer.error_count == 1
+    assert not Recipe.objects.exists()
+    _, files = default_storage.listdir('')
+    assert not [name for name in files if name.endswith('.png')]
+
+
+def test_error_messages_are_capped(user):
+    lines = ['{"name": "без автора"}'] * (bulk.MAX_ERRORS + 5)
+    importer = RecipeImporter().load(lines)
+    assert importer.error_count == bulk.MAX_ERRORS + 5
+    assert len(importer.errors) == bulk.MAX_ERRORS
+
+
+@pytest.mark.parametrize('image', ('../../../etc/passwd', 'recipes/нет.png'))
+def test_image_path_must_exist_in_storage(record, image):
+    importer = RecipeImporter().load([json.dumps(dict(record, image=image))])
+    assert importer.created == 0
+    assert importer.errors == [f'Строка 1: картинка {image} не найдена']
+
+
+def test_image_path_in_storage_is_kept(record):
+    name = default_storage.save('recipes/блины.png', ContentFile(png()))
+    importer = RecipeImporter().load([json.dumps(dict(record, image=name))])
+    assert importer.created == 1
+    assert Recipe.objects.get().image.name == name
+
+
+def test_export_skips_missing_image(make_user, make_recipe):
+    recipes = [make_recipe(make_user()) for _ in range(2)]
+    missing = recipes[0].image.name
+    default_storage.delete(missing)
+    lines = [json.loads(line) for line in export_recipes(embed_images=True)]
+    assert lines[0]['image'] == missing
+    assert lines[1]['image'].startswith('data:image/png;base64,')
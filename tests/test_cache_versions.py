@@ -0,0 +1,30 @@
+import pytest
+
+from api.search import ingredient_index
+from recipes.cache import get_version
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.mark.parametrize('namespace, factory', (
+    ('ingredients', 'make_ingredient'),
+    ('tags', 'make_tag'),
+))
+def test_version_changes_after_commit(
+        request, django_capture_on_commit_callbacks, namespace, factory):
+    version = get_version(namespace)
+    with django_capture_on_commit_callbacks(execute=True) as callbacks:
+        request.getfixturevalue(factory)()
+        assert get_version(namespace) == version
+    assert callbacks
+    assert get_version(namespace) == version + 1
+
+
+def test_ingredient_index_is_reloaded_after_commit(
+        make_ingredient, django_capture_on_commit_callbacks):
+    assert ingredient_index.search('соль') == []
+    with django_capture_on_commit_callbacks(execute=True):
+        salt = make_ingredient('соль')
+        assert ingredient_index.search('соль') == []
+    assert ingredient_index.search('соль') == [
+        {'id': salt.pk, 'name': 'соль', 'measurement_unit': 'г'}]
@@ -0,0 +1,49 @@
+import pytest
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.memcached import PyMemcacheCache
+from django.core.exceptions import ImproperlyConfigured
+
+from api.checks import check_shared_cache, require_shared_cache
+
+LOCMEM = {'default': {
+    'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+MEMCACHED = {'default': {
+    'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'LOCATION': 'memcached:11211',
+}}
+
+
+def test_local_cache_is_refused_outside_debug(settings):
+    settings.CACHES, settings.DEBUG = LOCMEM, False
+    assert [error.id for error in check_shared_cache(None)] == ['api.E001']
+    with pytest.raises(ImproperlyConfigured):
+        require_shared_cache()
+
+
+@pytest.mark.parametrize('caches, debug', ((LOCMEM, True), (MEMCACHED, False)))
+def test_shared_or_debug_cache_is_allowed(settings, caches, debug):
+    settings.CACHES, settings.DEBUG = caches, debug
+    assert check_shared_cache(None) == []
+    require_shared_cache()
+
+
+@pytest.mark.django_db
+def test_response_keys_are_valid_for_memcached(
+        client_for, make_ingredient, monkeypatch, settings):
+    settings.INGREDIENT_SEARCH_IN_MEMORY = False
+    make_ingredient('соль')
+    keys = []
+    memcached = PyMemcacheCache('memcached:11211', {})
+    get = LocMemCache.get
+
+    def validated_get(self, key, default=None, version=None):
+        memcached.validate_key(memcached.make_key(key, version))
+        keys.append(key)
+        return get(self, key, default, version)
+
+    monkeypatch.setattr(LocMemCache, 'get', validated_get)
+    response = client_for().get(
+        '/api/ingredients/', {'name': 'с' * 300},
+        HTTP_ACCEPT='application/json; indent=4')
+    assert response.status_code == 200
+    assert any(key.startswith('response:') for key in keys)
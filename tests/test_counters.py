@@ -0,0 +1,53 @@
+import pytest
+
+from recipes.counters import reconcile_counters
+from recipes.models import Favorite, ShoppingCart
+from users.models import Follow
+
+pytestmark = pytest.mark.django_db
+
+
+def no_drift():
+    return not any(reconcile_counters(check=True).values())
+
+
+def test_orm_writes_keep_counters(make_user, make_recipe):
+    '''Рецепты, избранное, корзина и подписки в обход API.'''
+    author, reader = make_user(), make_user()
+    recipe = make_recipe(author)
+    make_recipe(author)
+    Favorite.objects.create(user=reader, recipe=recipe)
+    ShoppingCart.objects.create(user=reader, recipe=recipe)
+    Follow.objects.create(user=reader, author=author)
+    author.refresh_from_db()
+    recipe.refresh_from_db()
+    assert (author.recipes_count, author.followers_count) == (2, 1)
+    assert (recipe.favorites_count, recipe.in_cart_count) == (1, 1)
+    assert no_drift()
+
+    Favorite.objects.filter(user=reader).delete()
+    recipe.delete()
+    author.refresh_from_db()
+    assert author.recipes_count == 1
+    assert no_drift()
+
+
+def test_cascade_from_deleted_user(make_user, make_recipe):
+    author, reader = make_user(), make_user()
+    recipe = make_recipe(author)
+    Favorite.objects.create(user=reader, recipe=recipe)
+    Follow.objects.create(user=reader, author=author)
+    reader.delete()
+    author.refresh_from_db()
+    recipe.refresh_from_db()
+    assert author.followers_count == 0
+    assert recipe.favorites_count == 0
+    assert no_drift()
+
+
+def test_subscription_shows_recipes_count(make_user, make_recipe, client_for):
+    author, reader = make_user(), make_user()
+    make_recipe(author)
+    Follow.objects.create(user=reader, author=author)
+    response = client_for(reader).get('/api/users/subscriptions/')
+    assert response.json()['results'][0]['recipes_count'] == 1
@@ -0,0 +1,116 @@
+import pytest
+from django.db import OperationalError, connections
+from django.test.utils import CaptureQueriesContext
+
+from api import db_router
+
+pytestmark = pytest.mark.django_db(
+    transaction=True, databases=['default', 'replica'])
+
+
+@pytest.fixture(autouse=True)
+def replica(settings):
+    '''Реплика - зеркало default из tests.settings.'''
+    settings.REPLICA_DATABASES = ['replica']
+    db_router._down_until.clear()
+    db_router._checked_until.clear()
+    yield
+    db_router._down_until.clear()
+    db_router._checked_until.clear()
+
+
+@pytest.fixture
+def recipe(make_user, make_recipe, make_ingredient):
+    return make_recipe(make_user(), {make_ingredient(): 10})
+
+
+def read(client, url):
+    '''Ответ и SQL запросы (без пробы SELECT 1) к default и реплике.'''
+    with CaptureQueriesContext(connections['default']) as default, \
+            CaptureQueriesContext(connections['replica']) as replica:
+        response = client.get(url)
+    return response, [
+        [query['sql'] for query in queries if query['sql'] != 'SELECT 1']
+        for queries in (default, replica)
+    ]
+
+
+def test_safe_methods_read_from_replica(client_for, recipe):
+    response, (default, replica) = read(client_for(), '/api/recipes/')
+    assert response.status_code == 200
+    assert response.data['count'] == 1
+    # Список и COUNT - с реплики; заполнение кеша - из default.
+    assert sum('recipes_recipe' in sql for sql in replica) == 2
+    assert not any('COUNT(' in sql for sql in default)
+
+
+def test_user_sticks_to_primary_after_write(client_for, user, recipe):
+    client = client_for(user)
+    response = client.post(f'/api/recipes/{recipe.pk}/favorite/')
+    assert response.status_code == 201
+
+    response, (default, replica) = read(client, '/api/recipes/')
+    assert response.data['results'][0]['is_favorited'] is True
+    assert any('recipes_recipe' in sql for sql in default)
+    assert replica == []
+
+    _, (default, replica) = read(client_for(), '/api/recipes/')
+    assert default == []
+    assert replica
+
+
+def test_dead_replica_falls_back_to_primary(
+        client_for, recipe, monkeypatch):
+    replica = connections['replica']
+    # Открытое соединение, которое сервер уже разорвал:
+    # ensure_connection его не проверяет.
+    replica.ensure_connection()
+    probes = []
+
+    def cursor():
+        probes.append(1)
+        raise OperationalError('server closed the connection unexpectedly')
+
+    monkeypatch.setattr(replica, 'cursor', cursor)
+    for _ in range(2):
+        response, (default, _) = read(client_for(), '/api/recipes/')
+        assert response.status_code == 200
+        assert response.data['count'] == 1
+        assert any('recipes_recipe' in sql for sql in default)
+    # Второй запрос не проверяет реплику: она помечена недоступной.
+    assert probes == [1]
+    assert 'replica' in db_router._down_until
+
+
+def test_probe_result_is_cached(client_for, recipe):
+    with CaptureQueriesContext(connections['replica']) as queries:
+        for _ in range(3):
+            client_for().get('/api/recipes/')
+    assert [query['sql'] for query in queries].count('SELECT 1') == 1
+
+
+def test_recipe_cache_is_filled_from_primary(client_for, recipe):
+    '''Промах кеша: рецепт перечитывается из default, иначе строки
+    отстающей реплики сохранились бы под новой версией.'''
+    response, (default, replica) = read(client_for(), '/api/recipes/')
+    assert response.data['results'][0]['name'] == recipe.name
+    assert any('FROM "recipes_recipe"' in sql for sql in replica)
+    assert any('FROM "recipes_recipe"' in sql for sql in default)
+    assert any('recipes_ingredientamount' in sql for sql in default)
+    assert not any('recipes_ingredientamount' in sql for sql in replica)
+
+    response, (default, replica) = read(client_for(), '/api/recipes/')
+    assert response.data['results'][0]['name'] == recipe.name
+    assert default == []
+
+
+@pytest.mark.parametrize('url', ('/api/tags/', '/api/ingredients/?name=с'))
+def test_reference_caches_are_filled_from_primary(
+        client_for, make_tag, make_ingredient, url):
+    make_tag()
+    make_ingredient('соль')
+    response, (default, replica) = read(client_for(), url)
+    assert response.status_code == 200
+    assert response.json()
+    assert default
+    assert replica == []
@@ -0,0 +1,24 @@
+import pytest
+from django.core.files.uploadedfile import SimpleUploadedFile
+
+from conftest import png
+from recipes.images import VARIANTS
+
+# Варианты строятся после настоящей фиксации транзакции, как в работе.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.mark.parametrize('size, width', (((300, 100), 300), ((100, 300), 100)))
+def test_srcset_uses_real_variant_widths(
+        client_for, user, make_recipe, size, width):
+    recipe = make_recipe(user)
+    recipe.image = SimpleUploadedFile('small.png', png(size))
+    recipe.save()
+    recipe.refresh_from_db()
+    fields = [field for field, _, _ in VARIANTS.values()]
+    assert [getattr(recipe, f'{field}_width') for field in fields] == [
+        width] * len(fields)
+
+    srcset = client_for().get(f'/api/recipes/{recipe.pk}/').data['srcset']
+    assert [candidate.rsplit(' ', 1)[1]
+            for candidate in srcset.split(', ')] == [f'{width}w'] * len(fields)
@@ -0,0 +1,60 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
+
+from recipes.models import Ingredient
+from users.models import User
+
+BEFORE_UNIQUE = [('recipes', '0003_shoppingcarttotal')]
+UNIQUE = [('recipes', '0004_ingredient_unique')]
+
+
+@pytest.mark.django_db
+def test_import_skips_malformed_csv_rows(tmp_path):
+    path = tmp_path / 'ingredients.csv'
+    path.write_text('молоко,мл\nбез единиц\n\nсоль,г\n', encoding='utf-8')
+    stderr = StringIO()
+    call_command('import_db', str(path), stdout=StringIO(), stderr=stderr)
+    assert set(Ingredient.objects.values_list(
+        'name', 'measurement_unit')) == {('молоко', 'мл'), ('соль', 'г')}
+    assert 'Строка 2' in stderr.getvalue()
+
+
+@pytest.mark.django_db(transaction=True)
+def test_unique_migration_merges_duplicates():
+    executor = MigrationExecutor(connection)
+    executor.migrate(BEFORE_UNIQUE)
+    apps = executor.loader.project_state(BEFORE_UNIQUE).apps
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    Recipe = apps.get_model('recipes', 'Recipe')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    # Таблица пользователей остается в текущей схеме.
+    author = User.objects.create(email='a@example.com', username='a')
+    kept = Ingredient.objects.create(name='соль', measurement_unit='г')
+    copy = Ingredient.objects.create(name='соль', measurement_unit='г')
+    spaced = Ingredient.objects.create(name=' соль\n', measurement_unit='г')
+    both = Recipe.objects.create(author_id=author.pk, name='оба', text='-',
+                                 cooking_time=1, image='a.png')
+    single = Recipe.objects.create(author_id=author.pk, name='один',
+                                   text='-', cooking_time=1, image='b.png')
+    IngredientAmount.objects.create(recipe=both, ingredient=kept, amount=2)
+    IngredientAmount.objects.create(recipe=both, ingredient=copy, amount=3)
+    IngredientAmount.objects.create(
+        recipe=single, ingredient=spaced, amount=5)
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(UNIQUE)
+    apps = executor.loader.project_state(UNIQUE).apps
+    Ingredient = apps.get_model('recipes', 'Ingredient')
+    IngredientAmount = apps.get_model('recipes', 'IngredientAmount')
+    assert list(Ingredient.objects.values_list('pk', 'name')) == [
+        (kept.pk, 'соль')]
+    assert set(IngredientAmount.objects.values_list(
+        'recipe_id', 'ingredient_id', 'amount')) == {
+        (both.pk, kept.pk, 5), (single.pk, kept.pk, 5)}
+
+    executor = MigrationExecutor(connection)
+    executor.migrate(executor.loader.graph.leaf_nodes())
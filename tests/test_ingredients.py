@@ -0,0 +1,29 @@
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def ingredients(make_ingredient):
+    return [make_ingredient(name) for name in (
+        'сгущенное молоко', 'молоко', 'молочный шоколад', 'соль')]
+
+
+@pytest.mark.parametrize('in_memory', (True, False))
+def test_search_puts_prefix_matches_first(
+        client_for, ingredients, settings, in_memory):
+    settings.INGREDIENT_SEARCH_IN_MEMORY = in_memory
+    response = client_for().get('/api/ingredients/', {'name': 'Мол'})
+    assert response.status_code == 200
+    assert [item['name'] for item in response.json()] == [
+        'молоко', 'молочный шоколад', 'сгущенное молоко']
+
+
+@pytest.mark.parametrize('in_memory', (True, False))
+def test_detail_ignores_search(client_for, ingredients, settings, in_memory):
+    settings.INGREDIENT_SEARCH_IN_MEMORY = in_memory
+    salt = ingredients[-1]
+    response = client_for().get(
+        f'/api/ingredients/{salt.pk}/', {'name': 'мол'})
+    assert response.status_code == 200
+    assert response.json()['name'] == 'соль'
@@ -0,0 +1,65 @@
+import asyncio
+import re
+import time
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.test import AsyncClient
+
+from api.middleware import PerformanceMiddleware
+from api.serializers import CachedRecipeSerializer
+
+TIMING = re.compile(r'(\w+);dur=([\d.]+)')
+ENTRIES = ['db', 'app', 'serialize', 'render', 'total']
+# Задержка сериализации в тестах, мс.
+DELAY = 50
+
+
+@pytest.fixture(autouse=True)
+def sample_all(settings):
+    settings.PERFORMANCE_SAMPLE_RATE = 1.0
+
+
+def timings(response):
+    return {name: float(value)
+            for name, value in TIMING.findall(response['Server-Timing'])}
+
+
+@pytest.mark.django_db
+def test_serializer_time_is_reported_separately(
+        client_for, user, make_recipe, make_ingredient, monkeypatch):
+    make_recipe(user, {make_ingredient(): 10})
+    client = client_for(user)
+    # Первый запрос процесса импортирует URLconf и прочее.
+    client.get('/api/recipes/')
+    represent = CachedRecipeSerializer.represent
+
+    def slow_represent(self, recipes):
+        time.sleep(DELAY / 1000)
+        return represent(self, recipes)
+
+    monkeypatch.setattr(CachedRecipeSerializer, 'represent', slow_represent)
+    response = client.get('/api/recipes/')
+    assert response.status_code == 200
+    values = timings(response)
+    assert list(values) == ENTRIES
+    assert values['serialize'] >= DELAY
+    assert values['app'] < DELAY
+    assert 'queries;desc=' in response['Server-Timing']
+
+
+def test_middleware_is_marked_as_coroutine_for_async_chain():
+    async def get_response(request):
+        pass
+
+    assert asyncio.iscoroutinefunction(PerformanceMiddleware(get_response))
+    assert not asyncio.iscoroutinefunction(
+        PerformanceMiddleware(lambda request: None))
+
+
+@pytest.mark.django_db(transaction=True)
+def test_async_views_report_serialize(make_tag):
+    make_tag()
+    response = async_to_sync(AsyncClient().get)('/api/async/tags/')
+    assert response.status_code == 200
+    assert list(timings(response)) == ENTRIES
@@ -0,0 +1,48 @@
+import base64
+import json
+
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+
+def cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode()).decode()
+
+
+@pytest.fixture
+def recipes(user, make_recipe):
+    return [make_recipe(user, name=f'рецепт {number}') for number in range(5)]
+
+
+def test_cursor_pages_do_not_overlap(client_for, recipes):
+    client = client_for()
+    first = client.get('/api/recipes/', {'limit': 3, 'cursor': ''}).json()
+    second = client.get(first['next']).json()
+    names = [recipe['name'] for recipe in first['results'] + second['results']]
+    assert names == sorted(recipe.name for recipe in recipes)
+    assert second['next'] is None
+
+
+@pytest.mark.parametrize('value', (
+    cursor(['a', 'b']),
+    cursor(['a', 10 ** 30]),
+    cursor(['a', [1]]),
+    cursor([None, 1]),
+    cursor(['a']),
+    cursor({'name': 'a'}),
+    'не base64',
+))
+def test_invalid_cursor_is_not_found(client_for, recipes, value):
+    response = client_for().get('/api/recipes/', {'cursor': value})
+    assert response.status_code == 404
+
+
+@pytest.mark.parametrize('value', (
+    cursor(['a', 'b']),
+    cursor(['не дата', 1]),
+    cursor(['2026-01-01T00:00:00', 'b']),
+))
+def test_invalid_feed_cursor_is_not_found(client_for, user, value):
+    response = client_for(user).get('/api/recipes/feed/', {'cursor': value})
+    assert response.status_code == 404
@@ -0,0 +1,82 @@
+import pytest
+from django.core.management import call_command
+from django.db import connection
+
+from api.query_plans import main_queries, seq_scans
+from recipes.generate import DataGenerator
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+pytestmark = [
+    pytest.mark.skipif(connection.vendor != 'postgresql',
+                       reason='EXPLAIN проверяется только на PostgreSQL.'),
+    pytest.mark.django_db,
+]
+
+# На таком объеме планировщик сам выбирает индексы; без них - Seq Scan.
+USERS, RECIPES, INGREDIENTS = 1000, 10000, 20000
+QUERIES = (
+    'recipes: list',
+    'recipes: filters',
+    'recipes: detail',
+    'recipes: ingredient prefetch',
+    'recipes: tag prefetch',
+    'recipes: favorite add',
+    'recipes: cart add',
+    'recipes: download_shopping_cart',
+    'users: subscriptions',
+    'users: subscription recipes',
+    'users: followers',
+    'ingredients: search',
+)
+
+
+def has_index(name):
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT 1 FROM pg_indexes WHERE indexname = %s',
+                       [name])
+        return cursor.fetchone() is not None
+
+
+@pytest.fixture(scope='module')
+def queries(django_db_setup, django_db_blocker):
+    '''Данные генератора (с ANALYZE) на весь модуль.
+
+    Генерация занимает секунды, поэтому данные сохраняются один раз
+    и удаляются после модуля: транзакцию теста Django закрывает
+    вместе с соединением.
+    '''
+    with django_db_blocker.unblock():
+        DataGenerator(users=USERS, recipes=RECIPES,
+                      ingredients=INGREDIENTS, seed=1).run()
+        user = User.objects.filter(
+            shopping_cart_totals__isnull=False,
+            follower__isnull=False,
+        ).order_by('pk').first()
+        tag = Tag.objects.order_by('pk').values_list('slug', flat=True)[0]
+        # Точное название: поиск выбирает единицы строк.
+        ingredient = Ingredient.objects.order_by('-pk').values_list(
+            'name', flat=True)[0]
+        yield lambda: main_queries(user, tag, ingredient)
+        call_command('flush', interactive=False, verbosity=0)
+
+
+def test_all_queries_are_checked(queries):
+    assert tuple(queries()) == QUERIES
+
+
+@pytest.mark.parametrize('name', QUERIES)
+def test_query_uses_indexes(queries, name):
+    if name == 'ingredients: search' and not has_index(
+            'recipes_ingredient_name_trgm'):
+        pytest.skip('Нет индекса pg_trgm (расширение не установлено).')
+    plan, scans = seq_scans(queries()[name])
+    assert not scans, plan
+
+
+def test_missing_index_is_detected(queries):
+    '''Данных достаточно, чтобы потеря индекса была видна в плане.'''
+    with connection.cursor() as cursor:
+        cursor.execute('DROP INDEX recipe_name_id_idx')
+    plan, scans = seq_scans(queries()['recipes: list'])
+    assert 'recipes_recipe' in scans, plan
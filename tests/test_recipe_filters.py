@@ -0,0 +1,95 @@
+import pytest
+from django.contrib.auth.models import AnonymousUser
+from django.http import QueryDict
+from rest_framework.test import APIRequestFactory
+
+from api.filters import RecipeFilter
+from recipes.models import Favorite, Recipe, ShoppingCart
+
+pytestmark = pytest.mark.django_db
+
+# Токен (в первом запросе), COUNT, страница, теги, ингредиенты -
+# при любом сочетании фильтров; пустой выдаче хватает токена и COUNT.
+LIST_QUERIES = 5
+EMPTY_QUERIES = 2
+
+
+@pytest.fixture
+def data(make_user, make_tag, make_recipe, make_ingredient):
+    '''Рецепты r1-r4 авторов a и b; у user в избранном r1, r3,
+    в корзине r1, r2.'''
+    user, a, b = make_user(), make_user(), make_user()
+    t1, t2, t3 = (make_tag(slug) for slug in ('t1', 't2', 't3'))
+    salt = make_ingredient()
+    recipes = {
+        'r1': make_recipe(a, {salt: 1}, tags=[t1, t2]),
+        'r2': make_recipe(a, {salt: 1}, tags=[t2]),
+        'r3': make_recipe(b, {salt: 1}, tags=[t1, t2, t3]),
+        'r4': make_recipe(b, {salt: 1}),
+    }
+    for name in ('r1', 'r3'):
+        Favorite.objects.create(user=user, recipe=recipes[name])
+    for name in ('r1', 'r2'):
+        ShoppingCart.objects.create(user=user, recipe=recipes[name])
+    return {'user': user, 'authors': {'a': a, 'b': b}, 'recipes': recipes}
+
+
+CASES = (
+    ('tags=t1&tags=t2', {'r1', 'r2', 'r3'}),
+    ('tags=t1&tags=t2&tags=t3', {'r1', 'r2', 'r3'}),
+    ('tags=t1&tags=t2&is_favorited=1', {'r1', 'r3'}),
+    ('tags=t1&tags=t2&is_favorited=1&is_in_shopping_cart=1', {'r1'}),
+    ('author=a&tags=t2&is_in_shopping_cart=1', {'r1', 'r2'}),
+    ('author=b&tags=t3&is_favorited=1', {'r3'}),
+    ('author=a&tags=t1&tags=t2&is_favorited=1&is_in_shopping_cart=1',
+     {'r1'}),
+    ('author=b&is_in_shopping_cart=1', set()),
+    ('is_favorited=0&is_in_shopping_cart=0', {'r1', 'r2', 'r3', 'r4'}),
+    ('tags=nope', set()),
+)
+
+
+def query(data, params):
+    '''Параметры с именами авторов заменяются на их id.'''
+    params = QueryDict(params, mutable=True)
+    if 'author' in params:
+        params['author'] = data['authors'][params['author']].pk
+    params['limit'] = 100
+    return params
+
+
+@pytest.mark.parametrize('params, expected', CASES)
+def test_combined_filters(
+        client_for, data, django_assert_num_queries, params, expected):
+    client = client_for(data['user'])
+    names = {recipe.pk: name for name, recipe in data['recipes'].items()}
+    with django_assert_num_queries(LIST_QUERIES if expected else EMPTY_QUERIES):
+        response = client.get('/api/recipes/', query(data, params))
+    assert response.status_code == 200
+    ids = [recipe['id'] for recipe in response.json()['results']]
+    assert len(ids) == len(set(ids)) == response.json()['count']
+    assert {names[pk] for pk in ids} == expected
+
+
+def test_user_filters_are_ignored_for_anonymous(client_for, data):
+    response = client_for().get(
+        '/api/recipes/', {'is_favorited': 1, 'is_in_shopping_cart': 1})
+    assert response.json()['count'] == len(data['recipes'])
+
+
+def test_filters_compose_as_exists_subqueries(data):
+    request = APIRequestFactory().get('/')
+    request.user = data['user']
+    params = query(
+        data, 'author=a&tags=t1&tags=t2&is_favorited=1&is_in_shopping_cart=1')
+    queryset = RecipeFilter(
+        params, queryset=Recipe.objects.all(), request=request).qs
+    sql = str(queryset.query).upper()
+    assert sql.count('EXISTS') == 3
+    # Внешний запрос читает только recipes_recipe: строки не размножаются.
+    assert 'JOIN' not in sql.split(' WHERE ', 1)[0]
+    assert 'DISTINCT' not in sql
+    request.user = AnonymousUser()
+    anonymous = RecipeFilter(
+        params, queryset=Recipe.objects.all(), request=request).qs
+    assert str(anonymous.query).upper().count('EXISTS') == 1
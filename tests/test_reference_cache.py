@@ -0,0 +1,29 @@
+import pytest
+
+pytestmark = pytest.mark.django_db
+
+
+def test_unknown_params_share_cache_entry(
+        client_for, make_tag, django_assert_num_queries):
+    make_tag()
+    client = client_for()
+    first = client.get('/api/tags/', {'x': 1})
+    with django_assert_num_queries(0):
+        second = client.get('/api/tags/', {'x': 2, 'utm': 'mail'})
+    assert second.status_code == 200
+    assert second['ETag'] == first['ETag']
+
+
+def test_whitelisted_params_are_part_of_key(
+        client_for, make_ingredient, settings, django_assert_num_queries):
+    settings.INGREDIENT_SEARCH_IN_MEMORY = False
+    make_ingredient('соль')
+    make_ingredient('сахар')
+    client = client_for()
+    salt = client.get('/api/ingredients/', {'name': 'соль', 'x': 1})
+    sugar = client.get('/api/ingredients/', {'name': 'сахар'})
+    assert [item['name'] for item in salt.json()] == ['соль']
+    assert [item['name'] for item in sugar.json()] == ['сахар']
+    with django_assert_num_queries(0):
+        again = client.get('/api/ingredients/', {'x': 2, 'name': 'соль'})
+    assert again['ETag'] == salt['ETag']
@@ -0,0 +1,137 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import IngredientAmount, ShoppingCart, ShoppingCartTotal
+
+# Суммы пересчитываются после фиксации транзакции.
+pytestmark = pytest.mark.django_db(transaction=True)
+
+CART_URL = '/api/recipes/{}/shopping_cart/'
+DOWNLOAD_URL = '/api/recipes/download_shopping_cart/?format=txt'
+
+
+def totals(user):
+    return dict(ShoppingCartTotal.objects.filter(user=user).values_list(
+        'ingredient__name', 'amount'))
+
+
+@pytest.fixture
+def salt(make_ingredient):
+    return make_ingredient('соль')
+
+
+@pytest.fixture
+def shared_recipe(make_user, make_recipe, make_tag, salt):
+    return make_recipe(make_user(), {salt: 10}, tags=[make_tag()])
+
+
+def test_recipe_in_two_carts_is_counted_once(
+        make_user, client_for, shared_recipe):
+    alice, bob = make_user(), make_user()
+    for user in (alice, bob):
+        response = client_for(user).post(CART_URL.format(shared_recipe.pk))
+        assert response.status_code == 201
+    assert totals(alice) == {'соль': 10}
+    assert totals(bob) == {'соль': 10}
+    response = client_for(bob).get(DOWNLOAD_URL)
+    assert b''.join(response.streaming_content).decode().endswith(
+        '- соль (г) - 10\n')
+
+
+def test_patch_recalculates_every_cart(
+        make_user, client_for, shared_recipe, salt, make_tag):
+    alice, bob = make_user(), make_user()
+    for user in (alice, bob):
+        client_for(user).post(CART_URL.format(shared_recipe.pk))
+    response = client_for(shared_recipe.author).patch(
+        f'/api/recipes/{shared_recipe.pk}/',
+        {'ingredients': [{'id': salt.pk, 'amount': 7}],
+         'tags': [make_tag().pk]},
+        format='json',
+    )
+    assert response.status_code == 200
+    assert totals(alice) == {'соль': 7}
+    assert totals(bob) == {'соль': 7}
+
+
+def test_refresh_sums_recipes_of_one_cart(
+        make_user, make_recipe, client_for, salt, make_ingredient):
+    sugar = make_ingredient('сахар')
+    alice, bob = make_user(), make_user()
+    author = make_user()
+    first = make_recipe(author, {salt: 10, sugar: 5})
+    second = make_recipe(author, {salt: 3})
+    for recipe in (first, second):
+        client_for(alice).post(CART_URL.format(recipe.pk))
+    client_for(bob).post(CART_URL.format(second.pk))
+    ShoppingCartTotal.objects.all().delete()
+    ShoppingCartTotal.objects.refresh([alice.pk], [salt])
+    assert totals(alice) == {'соль': 13}
+    assert totals(bob) == {}
+    ShoppingCartTotal.objects.refresh()
+    assert totals(alice) == {'соль': 13, 'сахар': 5}
+    assert totals(bob) == {'соль': 3}
+
+
+def test_orm_changes_refresh_totals(
+        make_user, make_recipe, client_for, salt):
+    '''Изменения в обход API (ORM, админка) тоже пересчитывают суммы.'''
+    alice, author = make_user(), make_user()
+    first = make_recipe(author, {salt: 10})
+    second = make_recipe(author, {salt: 5})
+    ShoppingCart.objects.create(user=alice, recipe=first)
+    assert totals(alice) == {'соль': 10}
+    amount = IngredientAmount.objects.get(recipe=first)
+    amount.amount = 50
+    amount.save()
+    ShoppingCart.objects.create(user=alice, recipe=second)
+    response = client_for(alice).get(DOWNLOAD_URL)
+    assert b''.join(response.streaming_content).decode().endswith(
+        '- соль (г) - 55\n')
+    amount.delete()
+    assert totals(alice) == {'соль': 5}
+    second.delete()
+    assert totals(alice) == {}
+
+
+def test_one_refresh_per_transaction(make_user, make_recipe, salt):
+    recipe = make_recipe(make_user(), {salt: 10})
+    users = [make_user() for _ in range(10)]
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=user, recipe=recipe) for user in users)
+    ShoppingCartTotal.objects.refresh(users)
+    assert totals(users[0]) == {'соль': 10}
+    with CaptureQueriesContext(connection) as queries:
+        recipe.delete()
+    # На транзакцию - пересчет корзин и пересчет ингредиентов рецепта,
+    # а не по пересчету на каждую корзину.
+    assert sum(
+        query['sql'].startswith('DELETE FROM "recipes_shoppingcarttotal"')
+        for query in queries
+    ) == 2
+    assert not ShoppingCartTotal.objects.exists()
+
+
+@pytest.mark.parametrize('accept', ('application/json', 'text/html', None))
+def test_download_without_format_is_text(
+        client_for, make_user, shared_recipe, accept):
+    user = make_user()
+    ShoppingCart.objects.create(user=user, recipe=shared_recipe)
+    headers = {'HTTP_ACCEPT': accept} if accept else {}
+    response = client_for(user).get(
+        '/api/recipes/download_shopping_cart/', **headers)
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'text/plain; charset=utf-8'
+    assert b''.join(response.streaming_content).decode().endswith(
+        '- соль (г) - 10\n')
+
+
+def test_download_format_param_wins(client_for, make_user, shared_recipe):
+    user = make_user()
+    ShoppingCart.objects.create(user=user, recipe=shared_recipe)
+    response = client_for(user).get(
+        '/api/recipes/download_shopping_cart/?format=csv',
+        HTTP_ACCEPT='application/json')
+    assert response.status_code == 200
+    assert response['Content-Type'].startswith('text/csv')
@@ -0,0 +1,38 @@
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from users.models import Follow
+
+pytestmark = pytest.mark.django_db
+
+
+def test_recipes_are_ranked_for_page_authors_only(
+        make_user, make_recipe, client_for):
+    reader = make_user()
+    authors = [make_user() for _ in range(3)]
+    for author in authors:
+        for _ in range(3):
+            make_recipe(author)
+        Follow.objects.create(user=reader, author=author)
+    with CaptureQueriesContext(connection) as queries:
+        response = client_for(reader).get(
+            '/api/users/subscriptions/', {'limit': 1, 'recipes_limit': 2})
+    assert response.status_code == 200
+    [subscription] = response.json()['results']
+    assert subscription['id'] == authors[0].pk
+    assert len(subscription['recipes']) == 2
+    [ranked] = [query['sql'] for query in queries
+                if 'ROW_NUMBER' in query['sql']]
+    assert f'"author_id" IN ({authors[0].pk})' in ranked
+
+
+def test_subscribe_returns_limited_recipes(make_user, make_recipe, client_for):
+    reader, author = make_user(), make_user()
+    for _ in range(3):
+        make_recipe(author)
+    response = client_for(reader).post(
+        f'/api/users/{author.pk}/subscribe/?recipes_limit=1')
+    assert response.status_code == 201
+    assert len(response.json()['recipes']) == 1
+    assert response.json()['recipes_count'] == 3